@@ -0,0 +1,260 @@
+import json
+import multiprocessing as mp
+import os
+import sys
+import tracemalloc
+from time import perf_counter
+from typing import Callable, Dict, Iterable, List
+
+from .headless_util import (HeadlessGameInterface, HeadlessSetupManager,
+                            load_trace)
+from .match_handler import match_handler
+from .showroom_util import dict_to_game_state, fetch_game_tick_packet
+from .start_match_util import create_match_config
+from .story_mode_util import manage_game_state
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize_latencies(latencies: List[float]) -> Dict[str, float]:
+    """Count, mean, p50, p99 and max of some latencies in seconds"""
+    if not latencies:
+        return {"count": 0}
+
+    ordered = sorted(latencies)
+    return {
+        "count": len(ordered),
+        "mean": sum(ordered) / len(ordered),
+        "p50": percentile(ordered, 50),
+        "p99": percentile(ordered, 99),
+        "max": ordered[-1],
+    }
+
+
+def print_latency_table(latencies_by_name: Dict[str, List[float]]):
+    print(f"{'name':<24}{'count':>8}{'mean ms':>10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, latencies in latencies_by_name.items():
+        summary = summarize_latencies(latencies)
+        if summary["count"] == 0:
+            print(f"{name:<24}{0:>8}")
+            continue
+        print(f"{name:<24}{summary['count']:>8}{summary['mean'] * 1000:>10.2f}{summary['p50'] * 1000:>10.2f}"
+              f"{summary['p99'] * 1000:>10.2f}{summary['max'] * 1000:>10.2f}")
+
+
+class _VirtualClock:
+    """Sleeping just moves the time forward, so the waits in the story loop cost nothing"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def sleep(self, seconds: float):
+        self.now += seconds
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+def replay_challenge(frames: Iterable[dict], challenge: dict, upgrades: dict) -> dict:
+    """Run the story mode loop against a packet trace instead of the game"""
+    game_interface = HeadlessGameInterface(frames)
+    setup_manager = HeadlessSetupManager(game_interface)
+    clock = _VirtualClock()
+    loop_stats = {}
+
+    start = perf_counter()
+    completed, results = manage_game_state(
+        challenge, upgrades, setup_manager, sleep=clock.sleep, clock=clock.monotonic, loop_stats=loop_stats
+    )
+    wall_seconds = perf_counter() - start
+
+    return {
+        "completed": completed,
+        "results": results,
+        # packets served also counts the ones read while waiting for cars to (de)spawn
+        "ticks": loop_stats.get("ticks", 0),
+        "state_writes": len(game_interface.state_writes),
+        "wall_seconds": wall_seconds,
+    }
+
+
+def benchmark_challenge(trace_path: str, challenge_path: str, upgrades: List[str] = [], repeats: int = 5):
+    """
+    Replay a recorded trace through a challenge a few times and print how fast the loop ran.
+    challenge_path is a JSON file with a single challenge, as sent by launch_challenge
+    """
+    frames = load_trace(trace_path)
+    with open(challenge_path, "r") as f:
+        challenge = json.load(f)
+
+    # upgrades are only ever checked for membership
+    upgrades = {upgrade: True for upgrade in upgrades}
+    game_seconds = frames[-1]["seconds_elapsed"] - frames[0]["seconds_elapsed"] if frames else 0
+
+    runs = [replay_challenge(frames, challenge, upgrades) for _ in range(repeats)]
+    best = min(runs, key=lambda run: run["wall_seconds"])
+
+    print(f"Replayed {len(frames)} frames ({game_seconds:.1f} game seconds) {repeats} times")
+    print(f"Completed: {best['completed']}, state writes: {best['state_writes']}")
+    print(f"Best run: {best['wall_seconds']:.3f}s, {best['ticks'] / best['wall_seconds']:.0f} ticks/sec, "
+          f"{game_seconds / best['wall_seconds']:.1f}x real time")
+
+    return runs
+
+
+def measure(operation: Callable[[], object], iterations: int = 1000) -> dict:
+    """
+    Time an operation, then measure how much memory it allocates.
+    Allocations are measured in a separate pass because tracing slows everything down
+    """
+    latencies = []
+    for _ in range(iterations):
+        start = perf_counter()
+        operation()
+        latencies.append(perf_counter() - start)
+
+    allocation_samples = min(iterations, 100)
+    allocated = 0
+    tracemalloc.start()
+    for _ in range(allocation_samples):
+        # this also resets the peak
+        tracemalloc.clear_traces()
+        operation()
+        allocated += tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    summary = summarize_latencies(latencies)
+    summary["ops_per_sec"] = len(latencies) / sum(latencies)
+    summary["peak_kib_per_op"] = allocated / allocation_samples / 1024
+    return summary
+
+
+def _bot_list(num_bots: int) -> List[dict]:
+    return [
+        {"name": f"Psyonix {i}", "team": i % 2, "skill": 1.0, "runnable_type": "psyonix", "path": None}
+        for i in range(num_bots)
+    ]
+
+
+def _match_settings() -> dict:
+    return {
+        "game_mode": "Soccer",
+        "map": "DFHStadium",
+        "skip_replays": False,
+        "instant_start": False,
+        "enable_lockstep": False,
+        "enable_rendering": False,
+        "enable_state_setting": True,
+        "auto_save_replay": False,
+        "match_behavior": "Restart",
+        "mutators": {
+            "match_length": "5 Minutes",
+            "max_score": "Unlimited",
+            "overtime": "Unlimited",
+            "series_length": "Unlimited",
+            "game_speed": "Default",
+            "ball_max_speed": "Default",
+            "ball_type": "Default",
+            "ball_weight": "Default",
+            "ball_size": "Default",
+            "ball_bounciness": "Default",
+            "boost_amount": "Default",
+            "rumble": "None",
+            "boost_strength": "1x",
+            "gravity": "Default",
+            "demolish": "Default",
+            "respawn_time": "3 Seconds",
+        },
+        "scripts": [],
+    }
+
+
+def _full_state(num_cars: int) -> dict:
+    def physics():
+        return {
+            "location": {"x": 1, "y": 2, "z": 3},
+            "velocity": {"x": 1, "y": 2, "z": 3},
+            "angular_velocity": {"x": 1, "y": 2, "z": 3},
+            "rotation": {"pitch": 0.1, "yaw": 0.2, "roll": 0.3},
+        }
+
+    return {
+        "ball": {"physics": physics()},
+        "cars": {str(i): {"physics": physics(), "boost_amount": 50} for i in range(num_cars)},
+        "game_info": {"paused": False, "world_gravity_z": -650, "game_speed": 1},
+    }
+
+
+class _SignallingGameInterface(HeadlessGameInterface):
+    """Tells the benchmark when a state write went through, since set_state replies before it happens"""
+
+    def __init__(self, written: mp.Queue):
+        super().__init__()
+        self._written = written
+
+    def set_game_state(self, game_state):
+        self._written.put(True)
+
+
+def _quiet_match_handler(q: mp.Queue, out: mp.Queue, written: mp.Queue):
+    # the handler prints every command, which would drown out the results
+    sys.stdout = open(os.devnull, "w")
+    # importing everything in the background would land in the timed iterations
+    match_handler(q, out, lambda: HeadlessSetupManager(_SignallingGameInterface(written)), warm_up=False)
+
+
+def measure_handler_throughput(command: str, iterations: int = 1000, wait_for_state_write: bool = False) -> dict:
+    """
+    Send a command to a headless match handler process over and over, waiting for each reply.
+    With wait_for_state_write, also wait until the command has written the game state
+    """
+    command_queue = mp.Queue()
+    out_queue = mp.Queue()
+    written_queue = mp.Queue()
+    handler = mp.Process(target=_quiet_match_handler, args=(command_queue, out_queue, written_queue))
+    handler.start()
+
+    latencies = []
+    try:
+        for _ in range(iterations):
+            start = perf_counter()
+            command_queue.put(command)
+            out_queue.get(timeout=10)
+            if wait_for_state_write:
+                written_queue.get(timeout=10)
+            latencies.append(perf_counter() - start)
+    finally:
+        command_queue.put("shut_down | ")
+        handler.join(timeout=10)
+        if handler.is_alive():
+            handler.terminate()
+
+    summary = summarize_latencies(latencies)
+    summary["ops_per_sec"] = len(latencies) / sum(latencies)
+    return summary
+
+
+def run_benchmarks(iterations: int = 1000, num_bots: int = 64, num_cars: int = 8) -> Dict[str, dict]:
+    """Benchmark the command path without Rocket League and print the results"""
+    bot_list = _bot_list(num_bots)
+    match_settings = _match_settings()
+    state = _full_state(num_cars)
+    setup_manager = HeadlessSetupManager(HeadlessGameInterface(num_cars=num_cars))
+
+    results = {
+        f"create_match_config ({num_bots} bots)": measure(lambda: create_match_config(bot_list, match_settings), iterations),
+        f"fetch_game_tick_packet ({num_cars} cars)": measure(lambda: json.dumps(fetch_game_tick_packet(setup_manager)), iterations),
+        f"dict_to_game_state ({num_cars} cars)": measure(lambda: dict_to_game_state(state), iterations),
+        "match_handler fetch_gtp": measure_handler_throughput("fetch_gtp | ", iterations),
+        f"match_handler set_state ({num_cars} cars)": measure_handler_throughput(f"set_state | {json.dumps(state)}", iterations, wait_for_state_write=True),
+    }
+
+    print(f"{'benchmark':<40}{'ops/sec':>12}{'p50 us':>10}{'p99 us':>10}{'peak KiB/op':>14}")
+    for name, result in results.items():
+        peak = f"{result['peak_kib_per_op']:.1f}" if "peak_kib_per_op" in result else "-"
+        print(f"{name:<40}{result['ops_per_sec']:>12.0f}{result['p50'] * 1e6:>10.1f}{result['p99'] * 1e6:>10.1f}{peak:>14}")
+
+    return results
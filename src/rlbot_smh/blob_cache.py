@@ -0,0 +1,67 @@
+import json
+from collections import OrderedDict
+from copy import deepcopy
+from hashlib import sha256
+from threading import Lock
+from typing import Any, List
+
+
+class BlobCache:
+    """
+    Parsed JSON arguments, keyed by the sha256 (hex) of their text.
+    Any JSON argument can be sent as @<hash> once the blob was sent with put_blob.
+    """
+
+    def __init__(self, max_size: int = 64):
+        self._max_size = max_size
+        # hash -> parsed blob, least recently used first
+        self._blobs = OrderedDict()
+        self._lock = Lock()
+
+    def put(self, blob_hash: str, text: str):
+        text = text.strip()
+        actual_hash = sha256(text.encode("utf-8")).hexdigest()
+        if actual_hash != blob_hash:
+            raise ValueError(f"Blob hash mismatch, expected {blob_hash} but got {actual_hash}")
+
+        blob = json.loads(text)
+
+        with self._lock:
+            self._blobs[blob_hash] = blob
+            self._blobs.move_to_end(blob_hash)
+            while len(self._blobs) > self._max_size:
+                self._blobs.popitem(last=False)
+
+    def missing(self, params: List[str]) -> List[str]:
+        """The hashes of all @<hash> params that aren't cached"""
+        with self._lock:
+            return [param.strip()[1:] for param in params if param.startswith("@") and param.strip()[1:] not in self._blobs]
+
+    def pin(self, params: List[str]) -> "BlobCache":
+        """
+        A cache of just the blobs these params use, for commands that read them on another thread.
+        Later put_blobs can't evict them from it. Check missing first, missing blobs are left out
+        """
+        pinned = BlobCache(max_size=len(params))
+        with self._lock:
+            for param in params:
+                blob_hash = param.strip()[1:]
+                if param.startswith("@") and blob_hash in self._blobs:
+                    pinned._blobs[blob_hash] = self._blobs[blob_hash]
+                    self._blobs.move_to_end(blob_hash)
+        return pinned
+
+    def loads(self, param: str, mutable: bool = False) -> Any:
+        """
+        Parse a JSON argument, or look it up if it's a @<hash>.
+        Cached objects are shared, so ask for a mutable copy if it will be modified
+        """
+        if not param.startswith("@"):
+            return json.loads(param)
+
+        blob_hash = param.strip()[1:]
+        with self._lock:
+            blob = self._blobs[blob_hash]
+            self._blobs.move_to_end(blob_hash)
+
+        return deepcopy(blob) if mutable else blob
@@ -0,0 +1,163 @@
+import platform
+from threading import Event, Lock, Thread
+from typing import Dict, List, Optional
+
+import psutil
+from rlbot.setup_manager import SetupManager
+from rlbot.utils import logging_utils
+
+from .event_writer import emit_event
+
+logger = logging_utils.get_logger("bot_monitor")
+
+THROTTLED_PRIORITY = psutil.BELOW_NORMAL_PRIORITY_CLASS if platform.system() == "Windows" else 10
+
+
+class BotMonitor:
+    """
+    Samples the CPU and memory use of every bot process at a low rate,
+    and throttles or kills bots that stay over the limits for `strikes` samples in a row.
+    """
+
+    def __init__(self, sm: SetupManager):
+        self._sm = sm
+        self._lock = Lock()
+        self._stop_event = Event()
+        self._thread: Optional[Thread] = None
+        # psutil needs the same Process object between samples to work out the cpu usage
+        self._processes: Dict[int, psutil.Process] = {}
+        self._strikes: Dict[int, int] = {}
+        self._enforced: Dict[int, str] = {}
+        self._stats: List[dict] = []
+
+        self.interval = 2.0
+        self.report = False
+        self.max_cpu_percent: Optional[float] = None
+        self.max_rss_mb: Optional[float] = None
+        self.action = "throttle"
+        self.strikes = 3
+
+    def configure(self, options: dict):
+        """Takes any of interval, report, max_cpu_percent, max_rss_mb, action ("throttle" or "kill") and strikes"""
+        strikes = options.get("strikes", self.strikes)
+        if strikes < 1:
+            raise ValueError(f"strikes has to be at least 1, got {strikes}")
+
+        self.interval = options.get("interval", self.interval)
+        self.report = options.get("report", self.report)
+        self.max_cpu_percent = options.get("max_cpu_percent", self.max_cpu_percent)
+        self.max_rss_mb = options.get("max_rss_mb", self.max_rss_mb)
+        self.action = options.get("action", self.action)
+        self.strikes = strikes
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+
+        self._stop_event.clear()
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def reset(self):
+        """Forget everything about the previous bots"""
+        with self._lock:
+            self._processes.clear()
+            self._strikes.clear()
+            self._enforced.clear()
+            self._stats = []
+
+    def stats(self) -> List[dict]:
+        with self._lock:
+            return self._stats
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            stats = self.sample()
+            if self.report:
+                emit_event("BOT_STATS", stats)
+            self._stop_event.wait(self.interval)
+
+    def _bot_processes(self, pids) -> List[psutil.Process]:
+        processes = []
+        for pid in pids:
+            process = self._processes.get(pid)
+            try:
+                if process is None:
+                    process = psutil.Process(pid)
+                    self._processes[pid] = process
+                processes.append(process)
+                for child in process.children(recursive=True):
+                    processes.append(self._processes.setdefault(child.pid, child))
+            except psutil.Error:
+                self._processes.pop(pid, None)
+        return processes
+
+    def sample(self) -> List[dict]:
+        """Take a new sample of every bot, and enforce the limits"""
+        stats = []
+
+        for index, metadata in list(self._sm.agent_metadata_map.items()):
+            cpu_percent = 0
+            rss = 0
+            processes = self._bot_processes(metadata.pids)
+            for process in processes:
+                try:
+                    cpu_percent += process.cpu_percent()
+                    rss += process.memory_info().rss
+                except psutil.Error:
+                    self._processes.pop(process.pid, None)
+
+            bot_stats = {
+                "index": index,
+                "name": metadata.name,
+                "team": metadata.team,
+                "pids": [process.pid for process in processes],
+                "cpu_percent": cpu_percent,
+                "rss_mb": rss / 1024 / 1024,
+                "enforced": self._enforced.get(index),
+            }
+            self._enforce(bot_stats, processes)
+            stats.append(bot_stats)
+
+        with self._lock:
+            self._stats = stats
+
+        return stats
+
+    def _enforce(self, bot_stats: dict, processes: List[psutil.Process]):
+        index = bot_stats["index"]
+        over_limit = (
+            (self.max_cpu_percent is not None and bot_stats["cpu_percent"] > self.max_cpu_percent)
+            or (self.max_rss_mb is not None and bot_stats["rss_mb"] > self.max_rss_mb)
+        )
+
+        if not over_limit:
+            self._strikes[index] = 0
+            return
+
+        self._strikes[index] = self._strikes.get(index, 0) + 1
+        if self._strikes[index] < self.strikes or self._enforced.get(index) == self.action:
+            return
+
+        logger.warning(f"{bot_stats['name']} is over the limits ({bot_stats['cpu_percent']:.0f}% cpu, "
+                       f"{bot_stats['rss_mb']:.0f} MB), action: {self.action}")
+
+        for process in processes:
+            try:
+                if self.action == "kill":
+                    process.kill()
+                else:
+                    process.nice(THROTTLED_PRIORITY)
+            except psutil.Error:
+                pass
+
+        self._enforced[index] = self.action
+        bot_stats["enforced"] = self.action
+        emit_event("BOT_LIMIT", bot_stats)
@@ -0,0 +1,86 @@
+import zlib
+from base64 import standard_b64decode
+from gzip import decompress
+from typing import IO, Iterator, List
+
+# Input modes for listen()
+RAW = "raw"  # one plain text command per line
+GZIP = "gzip"  # one base64 encoded gzip file per line
+ZLIB = "zlib"  # one zlib stream over the whole session, written as binary to stdin
+ZLIB_BASE64 = "zlib-base64"  # the same zlib stream, but each line holds the next chunk in base64
+
+# Preset dictionary for the zlib modes, so even the first commands compress well.
+# The writer has to use the exact same bytes! Most common strings go at the end.
+COMMAND_DICTIONARY = b"".join((
+    b'"completionConditions":{"win":true,"selfDemoCount":"demoAchievedCount":"goalsScored":"scoreDifference":',
+    b'"humanTeamSize":"opponentBots":"limitations":["half-field"]',
+    b'"challenges_attempts":{"challenges_completed":{"upgrades":{"currency":"game_results":"challenge_completed":',
+    b'"boost-33":"boost-100":"boost-recharge":',
+    b'"ball":{"physics":"cars":{"0":{"physics":"boost_amount":"game_info":{"paused":"world_gravity_z":',
+    b'"location":{"x":"y":"z":"velocity":{"x":"angular_velocity":{"x":"rotation":{"pitch":"yaw":"roll":',
+    b'"blue":{"orange":{"team_color_id":"custom_color_id":"car_id":"decal_id":"wheels_id":"boost_id":',
+    b'"antenna_id":"hat_id":"paint_finish_id":"custom_finish_id":"engine_audio_id":"trails_id":"goal_explosion_id":',
+    b'"mutators":{"match_length":"5 Minutes","max_score":"Unlimited","overtime":"Unlimited","series_length":"Unlimited",',
+    b'"game_speed":"Default","ball_max_speed":"Default","ball_type":"Default","ball_weight":"Default",',
+    b'"ball_size":"Default","ball_bounciness":"Default","boost_amount":"Default","rumble":"None",',
+    b'"boost_strength":"1x","gravity":"Default","demolish":"Default","respawn_time":"3 Seconds"},',
+    b'{"game_mode":"Soccer","map":"DFHStadium","skip_replays":false,"instant_start":false,"enable_lockstep":false,',
+    b'"enable_rendering":false,"enable_state_setting":true,"auto_save_replay":false,"match_behavior":"Restart",',
+    b'"scripts":[]',
+    b'{"name":"Human","team":0,"skill":1.0,"runnable_type":"human","path":null},',
+    b'{"name":"Psyonix Allstar","team":1,"skill":1.0,"runnable_type":"psyonix","path":null},',
+    b'{"name":"","team":0,"skill":1.0,"runnable_type":"rlbot","path":"',
+    b'.cfg"},',
+    b'start_match | [kill_bots | set_state | {fetch_gtp | spawn_car_for_viewing | {launch_challenge | ',
+    b'put_blob | @ | true | false | epic | steam | ',
+))
+
+
+def decode_gzip_line(line: str) -> str:
+    return decompress(standard_b64decode(line)).decode("utf-8")
+
+
+class ZlibCommandDecoder:
+    """
+    Decodes a single zlib stream that carries every command of the session, one per line.
+    The writer has to do a sync flush after each command so it can be decoded right away.
+    """
+
+    def __init__(self, use_dictionary: bool = True):
+        if use_dictionary:
+            self._decompressor = zlib.decompressobj(zdict=COMMAND_DICTIONARY)
+        else:
+            self._decompressor = zlib.decompressobj()
+        self._pending = b""
+
+    def feed(self, data: bytes) -> List[str]:
+        """Decompress the next chunk of the stream and return the commands it completed"""
+        self._pending += self._decompressor.decompress(data)
+        *lines, self._pending = self._pending.split(b"\n")
+        return [line.decode("utf-8") for line in lines]
+
+
+def read_commands(stream: IO[str], mode: str = RAW, use_dictionary: bool = True) -> Iterator[str]:
+    """Yield every command from the stream until it closes"""
+    if mode == ZLIB:
+        # skip the text layer, there's no need for base64 on a binary pipe
+        binary_stream = stream.buffer
+        decoder = ZlibCommandDecoder(use_dictionary)
+        while True:
+            data = binary_stream.read1(65536)
+            if not data:
+                return
+            yield from decoder.feed(data)
+
+    decoder = ZlibCommandDecoder(use_dictionary) if mode == ZLIB_BASE64 else None
+    while True:
+        line = stream.readline()
+        if not line:
+            return
+
+        if mode == GZIP:
+            yield decode_gzip_line(line)
+        elif mode == ZLIB_BASE64:
+            yield from decoder.feed(standard_b64decode(line))
+        else:
+            yield line
@@ -0,0 +1,189 @@
+import io
+import json
+import os
+import sys
+from collections import deque
+from threading import Condition, Thread, local
+from typing import IO, Any, Optional
+
+# polling events that are replaced by a newer one if it's still waiting to be written,
+# they never wait for room in the queue, nobody cares about an old game tick packet
+DROP_STALE_EVENTS = {"GTP", "BOT_STATS"}
+
+
+class EventWriter:
+    """
+    Writes -|-*|EVENT ...|*-|- lines from any thread through a single writer thread.
+    Every event is written whole and in order, and whatever is queued up is written and flushed at once.
+    Events in drop_stale are replaced or dropped when behind, the rest block the caller until there's room.
+    Plain lines (see capture_stdout) go through the same queue, so they can't end up inside an event
+    """
+
+    def __init__(self, stream: Optional[IO[str]] = None, max_queued: int = 256, max_batch_chars: int = 1 << 16, drop_stale=DROP_STALE_EVENTS):
+        # None means sys.stdout, looked up on every write in case it gets replaced
+        self._stream = stream
+        self.max_queued = max_queued
+        self.max_batch_chars = max_batch_chars
+        self.drop_stale = drop_stale
+
+        self._condition = Condition()
+        self._pid = None
+        self._thread: Optional[Thread] = None
+
+        self.events_written = 0
+        self.events_dropped = 0
+        self.writes = 0
+
+    def _reset(self):
+        # each entry is a [line, name] list, so a stale one can be blanked out where it is
+        self._queue = deque()
+        # name -> the entry of that event that's still queued
+        self._stale = {}
+        self._writing = False
+        self._pid = os.getpid()
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def emit(self, name: str, payload: Any = None):
+        """Queue an event, with payload sent as JSON if there is one"""
+        if payload is None:
+            line = f"-|-*|{name}|*-|-\n"
+        else:
+            # serialize here so the payload can't change while it's queued, and the writer thread stays quick
+            line = f"-|-*|{name} {json.dumps(payload)}|*-|-\n"
+
+        self._enqueue(line, name, name in self.drop_stale)
+
+    def write_line(self, line: str):
+        """Queue a plain line of output, it's never dropped"""
+        self._enqueue(line, None, False)
+
+    def _enqueue(self, line: str, name: Optional[str], stale: bool):
+        with self._condition:
+            # the writer thread doesn't survive a fork
+            if self._pid != os.getpid():
+                self._reset()
+
+            if stale:
+                previous = self._stale.get(name)
+                if previous is not None:
+                    self.events_dropped += 1
+                    if len(self._queue) >= self.max_queued:
+                        # no room to move it to the back, so just swap in the fresh one where it is
+                        previous[0] = line
+                        return
+                    previous[0] = None
+                elif len(self._queue) >= self.max_queued:
+                    self.events_dropped += 1
+                    return
+            else:
+                while len(self._queue) >= self.max_queued:
+                    self._condition.wait()
+
+            entry = [line, name]
+            self._queue.append(entry)
+            if stale:
+                self._stale[name] = entry
+            self._condition.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until everything queued so far has been written, returns False on timeout"""
+        with self._condition:
+            if self._pid != os.getpid():
+                return True
+            return self._condition.wait_for(lambda: not self._queue and not self._writing, timeout)
+
+    def stats(self) -> dict:
+        return {"events_written": self.events_written, "events_dropped": self.events_dropped, "writes": self.writes}
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._queue)
+
+                lines = []
+                events = 0
+                size = 0
+                while self._queue and (not lines or size < self.max_batch_chars):
+                    entry = self._queue.popleft()
+                    line, name = entry
+                    if self._stale.get(name) is entry:
+                        del self._stale[name]
+                    if line is not None:
+                        lines.append(line)
+                        size += len(line)
+                        if name is not None:
+                            events += 1
+
+                self._writing = True
+                self._condition.notify_all()
+
+            try:
+                if lines:
+                    stream = self._stream or sys.stdout
+                    stream.write("".join(lines))
+                    stream.flush()
+                    self.writes += 1
+                    self.events_written += events
+            except (OSError, ValueError):
+                # stdout is gone, there's nobody to tell
+                self.events_dropped += events
+            finally:
+                with self._condition:
+                    self._writing = False
+                    self._condition.notify_all()
+
+
+class _LineWriter(io.TextIOBase):
+    """
+    Stands in for sys.stdout and hands every complete line to the EventWriter.
+    print writes the text and the newline separately, so it could otherwise be split by an event
+    """
+
+    def __init__(self, writer: EventWriter, stream: IO[str]):
+        self._writer = writer
+        self._stream = stream
+        # each thread builds up its own line
+        self._local = local()
+
+    @property
+    def encoding(self):
+        return self._stream.encoding
+
+    def writable(self) -> bool:
+        return True
+
+    def isatty(self) -> bool:
+        return self._stream.isatty()
+
+    def fileno(self) -> int:
+        return self._stream.fileno()
+
+    def write(self, text: str) -> int:
+        lines = (getattr(self._local, "partial", "") + text).split("\n")
+        self._local.partial = lines.pop()
+        for line in lines:
+            self._writer.write_line(line + "\n")
+        return len(text)
+
+
+_writer = EventWriter()
+
+
+def emit_event(name: str, payload: Any = None):
+    _writer.emit(name, payload)
+
+
+def capture_stdout():
+    """Send everything printed in this process through the writer thread, in order with the events"""
+    if not isinstance(sys.stdout, _LineWriter):
+        _writer._stream = sys.stdout
+        sys.stdout = _LineWriter(_writer, sys.stdout)
+
+
+def flush_events(timeout: Optional[float] = None) -> bool:
+    return _writer.flush(timeout)
+
+
+def event_stats() -> dict:
+    return _writer.stats()
@@ -1,7 +1,220 @@
+import json
+import os
+import platform
 import sys
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 
-from rlbot.utils.requirements_management import (get_missing_packages,
-                                                 get_packages_needing_upgrade)
+# only keep the results of this many checks around
+MAX_CACHE_ENTRIES = 256
+# bump when the format of the cached results changes
+CACHE_VERSION = "2"
+
+
+def _cache_path() -> Path:
+    if platform.system() == "Windows" and "LOCALAPPDATA" in os.environ:
+        cache_dir = Path(os.environ["LOCALAPPDATA"])
+    elif "XDG_CACHE_HOME" in os.environ:
+        cache_dir = Path(os.environ["XDG_CACHE_HOME"])
+    else:
+        cache_dir = Path.home() / ".cache"
+    return cache_dir / "rlbot_smh" / "requirements_cache.json"
+
+
+def _site_packages_fingerprint() -> str:
+    """
+    Changes whenever something gets installed, upgraded or removed.
+    pip adds or replaces the dist-info folder of a package, which changes the mtime of the folder that holds it
+    """
+    fingerprint = sha256()
+    for entry in sys.path:
+        # packages only get installed into these, anything else (like "", the working directory) just adds noise
+        if os.path.basename(os.path.normpath(entry)) not in ("site-packages", "dist-packages"):
+            continue
+
+        try:
+            with os.scandir(entry) as it:
+                fingerprint.update(f"{entry}:{os.stat(entry).st_mtime_ns}".encode("utf-8"))
+                for dist in it:
+                    if dist.name.endswith((".dist-info", ".egg-info", ".egg-link", ".pth")):
+                        fingerprint.update(f"{dist.name}:{dist.stat().st_mtime_ns}".encode("utf-8"))
+        except OSError:
+            # doesn't exist
+            continue
+    return fingerprint.hexdigest()
+
+
+def _cache_key(requirements_file: str, requires_tkinter: bool, fingerprint: Optional[str] = None) -> Optional[str]:
+    try:
+        with open(requirements_file, "rb") as f:
+            requirements_hash = sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+    return "|".join((
+        CACHE_VERSION,
+        requirements_hash,
+        sys.executable,
+        sys.version,
+        str(requires_tkinter),
+        fingerprint or _site_packages_fingerprint(),
+    ))
+
+
+def _read_cache() -> dict:
+    try:
+        with open(_cache_path(), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_cache(cache: dict):
+    path = _cache_path()
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(temp_path, "w") as f:
+            json.dump(cache, f)
+        os.replace(temp_path, path)
+    except OSError:
+        # the cache is just a speed up, we can do without it
+        pass
+
+
+def _add_to_cache(cache: dict, key: str, result: dict):
+    cache.pop(key, None)
+    cache[key] = result
+    while len(cache) > MAX_CACHE_ENTRIES:
+        # dicts keep their order, so this is the least recently used entry
+        cache.pop(next(iter(cache)))
+
+
+class PackageIndex:
+    """
+    What's installed, read once so that any number of requirements files can be checked against it.
+    Building it is the slow part, checking a file against it is cheap
+    """
+
+    def __init__(self):
+        # rlbot's requirement utils scan every installed package on import, so only import them when needed
+        import pkg_resources
+        from rlbot.utils.requirements_management import \
+            SUPPORTED_SPECIAL_REQUIREMENTS
+
+        self.packages = {p.project_name: p for p in pkg_resources.working_set}
+        self.installed = set(self.packages) | set(SUPPORTED_SPECIAL_REQUIREMENTS)
+
+    def check(self, requirements_file: str, requires_tkinter: bool) -> Dict[str, List[str]]:
+        """The lines of the requirements that are missing, and the ones that need an upgrade"""
+        import pkg_resources
+        import requirements
+        from requirements.requirement import Requirement
+
+        with open(requirements_file, 'r') as fd, warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            needed = [r for r in requirements.parse(fd) if r.specifier]
+
+        special_reqs = [Requirement.parse_line('tkinter')] if requires_tkinter else []
+
+        missing = [r.line for r in special_reqs + needed if pkg_resources.safe_name(r.name) not in self.installed]
+
+        needs_upgrade = []
+        for r in needed:
+            existing = self.packages.get(pkg_resources.safe_name(r.name))
+            if existing is not None and existing.version not in pkg_resources.Requirement.parse(r.line).specifier:
+                needs_upgrade.append(r.line)
+
+        return {"missing": missing, "needs_upgrade": needs_upgrade}
+
+
+def find_requirements(requirements_file: str, requires_tkinter: bool) -> List[str]:
+    """The lines of the requirements that are missing or need an upgrade"""
+    result = PackageIndex().check(requirements_file, requires_tkinter)
+    return result["missing"] + result["needs_upgrade"]
+
+
+def find_requirements_cached(requirements_file: str, requires_tkinter: bool) -> List[str]:
+    """
+    Same as find_requirements, but reuses the last answer if the requirements file,
+    the interpreter and the installed packages are all the same
+    """
+    key = _cache_key(requirements_file, requires_tkinter)
+    cache = _read_cache()
+
+    if key is not None and key in cache:
+        result = cache[key]
+        # move it to the back of the line for eviction
+        _add_to_cache(cache, key, result)
+        _write_cache(cache)
+    else:
+        result = PackageIndex().check(requirements_file, requires_tkinter)
+
+        if key is not None:
+            # re-read in case another process added something in the meantime
+            cache = _read_cache()
+            _add_to_cache(cache, key, result)
+            _write_cache(cache)
+
+    return result["missing"] + result["needs_upgrade"]
+
+
+def find_requirements_batch(requests: List[Tuple[str, bool]], max_workers: int = 8) -> Dict[str, dict]:
+    """
+    Check many (requirements_file, requires_tkinter) pairs at once.
+    The installed packages are only read once, and only if some file isn't in the cache.
+    Each file maps to {"missing": [...], "needs_upgrade": [...]}, or {"error": "..."} if it couldn't be checked
+    """
+    # the same file could be listed by a few bots, only check it once
+    wanted: Dict[str, bool] = {}
+    for requirements_file, requires_tkinter in requests:
+        wanted[requirements_file] = wanted.get(requirements_file, False) or requires_tkinter
+
+    fingerprint = _site_packages_fingerprint()
+    cache = _read_cache()
+    results: Dict[str, dict] = {}
+    keys: Dict[str, str] = {}
+    hits: Dict[str, str] = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # hashing the files is just file reads, so do them all at once
+        cache_keys = executor.map(lambda item: _cache_key(item[0], item[1], fingerprint), wanted.items())
+
+        for requirements_file, key in zip(wanted, cache_keys):
+            if key is not None and key in cache:
+                results[requirements_file] = cache[key]
+                hits[requirements_file] = key
+            elif key is not None:
+                keys[requirements_file] = key
+            else:
+                results[requirements_file] = {"error": f"Couldn't read {requirements_file}"}
+
+        if keys:
+            index = PackageIndex()
+
+            def check(requirements_file: str) -> dict:
+                try:
+                    return index.check(requirements_file, wanted[requirements_file])
+                except Exception as e:
+                    return {"error": f"{type(e).__name__}: {e}"}
+
+            for requirements_file, result in zip(keys, executor.map(check, keys)):
+                results[requirements_file] = result
+
+    if keys or hits:
+        if keys:
+            # re-read in case another process added something in the meantime
+            cache = _read_cache()
+        # hits are moved to the back of the line for eviction too
+        for requirements_file, key in {**hits, **keys}.items():
+            if "error" not in results[requirements_file]:
+                _add_to_cache(cache, key, results[requirements_file])
+        _write_cache(cache)
+
+    return results
 
 
 # this python script exists because at this point we need Python to be configured in order to check reqs anyways
@@ -10,19 +223,7 @@ def run():
     requirements_file = tuple(arg for arg in sys.argv if "requirements_file" in arg)[0].split('=')[1]
     requires_tkinter = "requires_tkinter" in sys.argv
 
-    def get_missing_python_packages():
-        special_reqs = []
-        if requires_tkinter:
-            special_reqs.append('tkinter')
-
-        # this script shouldn't need to be called at all if we're using a virtual environment!
-        return get_missing_packages(requirements_file=requirements_file, special_reqs=special_reqs)
-
-    def get_python_packages_needing_upgrade():
-        # this script shouldn't need to be called if there's no requirements file!
-        return get_packages_needing_upgrade(requirements_file=requirements_file)
-
-    requirements = [r.line for r in get_missing_python_packages() + get_python_packages_needing_upgrade()]
+    requirements = find_requirements_cached(requirements_file, requires_tkinter)
 
     if len(requirements) > 0:
         out = "[\"" + "\",\"".join(requirements) + "\"]"
@@ -30,3 +231,13 @@ def run():
         out = "[]"
 
     print(out, end="")
+
+
+def run_batch():
+    """
+    Takes a JSON list of {"requirements_file": "...", "requires_tkinter": bool} on stdin,
+    and prints a JSON object of requirements file -> {"missing": [...], "needs_upgrade": [...]}
+    """
+    requests = [(item["requirements_file"], item.get("requires_tkinter", False)) for item in json.load(sys.stdin)]
+
+    print(json.dumps(find_requirements_batch(requests)), end="")
@@ -0,0 +1,285 @@
+import json
+import math
+import platform
+import queue
+import time
+from threading import Event
+from typing import Iterable, Iterator, List, Optional
+
+from rlbot.utils.game_state_util import GameState
+from rlbot.utils.structures.game_data_struct import GameTickPacket
+
+# A packet trace is a file with one JSON frame per line:
+# {
+#   "frame_num": 1234, "seconds_elapsed": 10.3, "is_match_ended": false,
+#   "teams": [[team_index, score], [team_index, score]],  <- raw values, exactly as found in the packet
+#   "latest_touch": {"team": 0, "player_index": 0, "player_name": "Human"},
+#   "cars": [{"name": "Human", "team": 0, "is_bot": false, "is_demolished": false, "boost": 33}]
+# }
+
+
+def packet_to_frame(packet: GameTickPacket) -> dict:
+    """Take the parts of the packet that story mode reads and make them serializable"""
+    touch = packet.game_ball.latest_touch
+    return {
+        "frame_num": packet.game_info.frame_num,
+        "seconds_elapsed": packet.game_info.seconds_elapsed,
+        "is_match_ended": packet.game_info.is_match_ended,
+        "teams": [[t.team_index, t.score] for t in packet.teams[:packet.num_teams]],
+        "latest_touch": {
+            "team": touch.team,
+            "player_index": touch.player_index,
+            "player_name": touch.player_name,
+        },
+        "cars": [
+            {
+                "name": car.name,
+                "team": car.team,
+                "is_bot": car.is_bot,
+                "is_demolished": car.is_demolished,
+                "boost": car.boost,
+            }
+            for car in packet.game_cars[:packet.num_cars]
+        ],
+    }
+
+
+def frame_to_packet(frame: dict, packet: GameTickPacket) -> GameTickPacket:
+    """Write a trace frame into an existing packet"""
+    packet.game_info.frame_num = frame["frame_num"]
+    packet.game_info.seconds_elapsed = frame["seconds_elapsed"]
+    packet.game_info.is_match_ended = frame["is_match_ended"]
+
+    packet.num_teams = len(frame["teams"])
+    for i, (team_index, score) in enumerate(frame["teams"]):
+        packet.teams[i].team_index = team_index
+        packet.teams[i].score = score
+
+    touch = frame["latest_touch"]
+    packet.game_ball.latest_touch.team = touch["team"]
+    packet.game_ball.latest_touch.player_index = touch["player_index"]
+    packet.game_ball.latest_touch.player_name = touch["player_name"]
+
+    packet.num_cars = len(frame["cars"])
+    for i, car in enumerate(frame["cars"]):
+        packet_car = packet.game_cars[i]
+        packet_car.name = car["name"]
+        packet_car.team = car["team"]
+        packet_car.is_bot = car["is_bot"]
+        packet_car.is_demolished = car["is_demolished"]
+        packet_car.boost = car["boost"]
+
+    return packet
+
+
+def load_trace(file_path: str) -> List[dict]:
+    with open(file_path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def save_trace(file_path: str, frames: Iterable[dict]):
+    with open(file_path, "w") as f:
+        for frame in frames:
+            f.write(json.dumps(frame))
+            f.write("\n")
+
+
+def record_trace(game_interface, file_path: str, key: int, max_seconds: float = 600):
+    """Record packets from a live game until the match ends or max_seconds have passed"""
+    packet = GameTickPacket()
+    start = time.monotonic()
+
+    with open(file_path, "w") as f:
+        while time.monotonic() - start < max_seconds:
+            game_interface.fresh_live_data_packet(packet, 1000, key)
+            f.write(json.dumps(packet_to_frame(packet)))
+            f.write("\n")
+
+            if packet.game_info.is_match_ended:
+                break
+
+
+def _raw_team(team_index: int, score: int) -> List[int]:
+    if platform.system() == "Windows":
+        return [team_index, score]
+
+    # mirror the packet bug that story mode works around on other platforms
+    return [score, team_index + 1]
+
+
+def synthetic_story_trace(
+    challenge: dict, seconds: float = 300, tick_rate: int = 120, human_boost: int = 100,
+    blue_goals: int = 0, orange_goals: int = 0, human_demos: int = 0, opponent_demos: int = 0
+) -> Iterator[dict]:
+    """
+    Generate the frames of a whole story match without the game.
+    Goals and demos are spread evenly over the match, and blue goals are always scored by the human.
+    """
+    human_team_size = challenge["humanTeamSize"]
+    opponent_count = len(challenge["opponentBots"])
+    total_ticks = int(seconds * tick_rate)
+    demo_ticks = 3 * tick_rate
+
+    def event_ticks(count: int) -> List[int]:
+        return [total_ticks * (i + 1) // (count + 1) for i in range(count)]
+
+    blue_goal_ticks = event_ticks(blue_goals)
+    orange_goal_ticks = event_ticks(orange_goals)
+    human_demo_ticks = event_ticks(human_demos)
+    opponent_demo_ticks = event_ticks(opponent_demos)
+
+    cars = [
+        {"name": "Human" if i == 0 else f"Teammate {i}", "team": 0, "is_bot": i != 0, "is_demolished": False, "boost": human_boost}
+        for i in range(human_team_size)
+    ] + [
+        {"name": f"Opponent {i}", "team": 1, "is_bot": True, "is_demolished": False, "boost": 33}
+        for i in range(opponent_count)
+    ]
+
+    for tick in range(total_ticks):
+        blue_score = sum(1 for t in blue_goal_ticks if t <= tick)
+        orange_score = sum(1 for t in orange_goal_ticks if t <= tick)
+
+        if tick in orange_goal_ticks:
+            latest_touch = {"team": 1, "player_index": human_team_size, "player_name": cars[human_team_size]["name"]}
+        else:
+            latest_touch = {"team": 0, "player_index": 0, "player_name": cars[0]["name"]}
+
+        frame_cars = [dict(car) for car in cars]
+        frame_cars[0]["is_demolished"] = any(t <= tick < t + demo_ticks for t in human_demo_ticks)
+        if opponent_count > 0:
+            frame_cars[human_team_size]["is_demolished"] = any(t <= tick < t + demo_ticks for t in opponent_demo_ticks)
+
+        yield {
+            "frame_num": tick,
+            "seconds_elapsed": tick / tick_rate,
+            "is_match_ended": tick == total_ticks - 1,
+            "teams": [_raw_team(0, blue_score), _raw_team(1, orange_score)],
+            "latest_touch": latest_touch,
+            "cars": frame_cars,
+        }
+
+
+def fill_synthetic_packet(packet: GameTickPacket, frame_num: int, num_cars: int, tick_rate: int = 120) -> GameTickPacket:
+    """Fill a packet with cars driving in circles around a bouncing ball"""
+    seconds = frame_num / tick_rate
+
+    packet.game_info.frame_num = frame_num
+    packet.game_info.seconds_elapsed = seconds
+    packet.game_info.is_round_active = True
+
+    ball = packet.game_ball.physics
+    ball.location.z = 93 + abs(math.sin(seconds)) * 500
+    ball.velocity.z = math.cos(seconds) * 500
+
+    packet.num_cars = num_cars
+    for i in range(num_cars):
+        car = packet.game_cars[i]
+        angle = seconds + i * 2 * math.pi / num_cars
+        car.name = f"Bot {i}"
+        car.team = i % 2
+        car.is_bot = True
+        car.boost = (frame_num + i * 10) % 101
+        car.physics.location.x = math.cos(angle) * 2000
+        car.physics.location.y = math.sin(angle) * 2000
+        car.physics.location.z = 17
+        car.physics.velocity.x = -math.sin(angle) * 1400
+        car.physics.velocity.y = math.cos(angle) * 1400
+        car.physics.rotation.yaw = angle + math.pi / 2
+        car.physics.angular_velocity.z = 0.7
+
+    packet.num_teams = 2
+    for i in range(2):
+        packet.teams[i].team_index = i
+        packet.teams[i].score = 0
+
+    return packet
+
+
+class HeadlessRenderer:
+    """Accepts every rendering call and draws nothing"""
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+class HeadlessGameInterface:
+    """
+    Stand-in for GameInterface that serves packets from a trace instead of the game.
+    Once the trace runs out, packets have no cars, like when the user leaves the match.
+    Without a trace, it serves synthetic packets with num_cars cars forever.
+    """
+
+    def __init__(self, frames: Optional[Iterable[dict]] = None, num_cars: int = 8):
+        self._frames = iter(frames) if frames is not None else None
+        self._num_cars = num_cars
+        self.renderer = HeadlessRenderer()
+        self.packets_served = 0
+        self.state_writes: List[GameState] = []
+
+    def load_interface(self, *args, **kwargs):
+        pass
+
+    def fresh_live_data_packet(self, game_tick_packet: GameTickPacket, timeout_millis: int, key: int) -> GameTickPacket:
+        return self.update_live_data_packet(game_tick_packet)
+
+    def update_live_data_packet(self, game_tick_packet: GameTickPacket) -> GameTickPacket:
+        if self._frames is None:
+            self.packets_served += 1
+            return fill_synthetic_packet(game_tick_packet, self.packets_served, self._num_cars)
+
+        frame = next(self._frames, None)
+        if frame is None:
+            game_tick_packet.num_cars = 0
+        else:
+            frame_to_packet(frame, game_tick_packet)
+            self.packets_served += 1
+        return game_tick_packet
+
+    def set_game_state(self, game_state: GameState):
+        self.state_writes.append(game_state)
+
+
+class HeadlessSetupManager:
+    """Stand-in for SetupManager that never touches Rocket League"""
+
+    def __init__(self, game_interface: Optional[HeadlessGameInterface] = None):
+        self.game_interface = game_interface or HeadlessGameInterface()
+        self.has_started = False
+        self.match_config = None
+        self.matches_started = 0
+        self.early_start_seconds = 0
+        self.num_metadata_received = 0
+        self.bot_processes = {}
+        self.script_processes = {}
+        self.agent_metadata_map = {}
+        self.agent_metadata_queue = queue.Queue()
+        self.quit_event = Event()
+        self.helper_process_manager = None
+
+    def connect_to_game(self, launcher_preference=None):
+        self.has_started = True
+
+    def load_match_config(self, match_config, bot_config_overrides={}):
+        self.match_config = match_config
+
+    def launch_early_start_bot_processes(self, match_config=None):
+        pass
+
+    def launch_bot_processes(self, match_config=None):
+        self.num_metadata_received = sum(1 for player in self.match_config.player_configs if player.rlbot_controlled)
+
+    def has_received_metadata_from_all_bots(self):
+        return True
+
+    def try_recieve_agent_metadata(self):
+        pass
+
+    def start_match(self):
+        self.matches_started += 1
+
+    def kill_matchcomms_server(self):
+        pass
+
+    def shut_down(self, time_limit=5, kill_all_pids=True, quiet=False):
+        pass
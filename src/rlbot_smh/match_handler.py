@@ -1,23 +1,100 @@
 import json
 import multiprocessing as mp
+import os
+import signal
 import sys
+from importlib import import_module
 from pathlib import Path
 from threading import Thread
+from time import perf_counter
 from traceback import print_exc
-from typing import List
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
 
-from rlbot.matchconfig.match_config import Team
-from rlbot.setup_manager import RocketLeagueLauncherPreference, SetupManager
+from .blob_cache import BlobCache
+from .command_stream import GZIP, RAW, decode_gzip_line, read_commands
+from .event_writer import capture_stdout, emit_event, flush_events
 
-from .showroom_util import (fetch_game_tick_packet, set_game_state,
-                            spawn_car_for_viewing)
-from .start_match_util import create_match_config, start_match_helper
-from .story_mode_util import add_match_result, run_challenge
+if TYPE_CHECKING:
+    from rlbot.setup_manager import SetupManager
 
+    from .bot_monitor_util import BotMonitor
+    from .series_util import SeriesRunner
+    from .start_match_util import MatchPreparer
 
-def start_match(params: List[str], sm: SetupManager, out: mp.Queue):
-    bot_list = json.loads(params[1])
-    match_settings = json.loads(params[2])
+# rlbot and the modules built on it take a few hundred ms to import,
+# so each command only imports what it needs the first time it's used
+COMMAND_MODULES = {
+    "start_match": ("rlbot.setup_manager", ".start_match_util"),
+    "prepare_match": ("rlbot.setup_manager", ".start_match_util"),
+    "commit_match": ("rlbot.setup_manager", ".start_match_util"),
+    "monitor_bots": ("rlbot.setup_manager", ".bot_monitor_util"),
+    "bot_stats": ("rlbot.setup_manager", ".bot_monitor_util"),
+    "kill_bots": (".teardown_util",),
+    "fetch_gtp": ("rlbot.setup_manager", ".showroom_util"),
+    "set_state": ("rlbot.setup_manager", ".showroom_util"),
+    "spawn_car_for_viewing": ("rlbot.setup_manager", ".showroom_util"),
+    "run_series": ("rlbot.setup_manager", ".series_util"),
+    "launch_challenge": ("rlbot.setup_manager", ".start_match_util", ".story_mode_util"),
+}
+
+# how long the match handler gets to stop the match and write out its events after replying to shut_down,
+# before listen terminates it
+SHUT_DOWN_SECONDS = 5
+
+# module -> how long its first import took, and what imported it
+_import_times: Dict[str, dict] = {}
+
+
+def _import(name: str, reason: str):
+    start = perf_counter()
+    module = import_module(name, __package__)
+    # only the first import does any work, the rest are a dict lookup
+    if name not in _import_times:
+        _import_times[name] = {"seconds": perf_counter() - start, "by": reason}
+    return module
+
+
+def import_command_modules(command: str):
+    for name in COMMAND_MODULES.get(command, ()):
+        _import(name, command)
+
+
+def prewarm():
+    """Import everything the commands need ahead of time, so the first real command doesn't have to wait"""
+    for names in COMMAND_MODULES.values():
+        for name in names:
+            _import(name, "prewarm")
+
+
+class _Lazy:
+    """Makes something the first time it's needed"""
+
+    def __init__(self, factory: Callable[[], object]):
+        self._factory = factory
+        self._value = None
+
+    @property
+    def made(self) -> bool:
+        return self._value is not None
+
+    def get(self):
+        if self._value is None:
+            self._value = self._factory()
+        return self._value
+
+
+def _default_setup_manager() -> "SetupManager":
+    from rlbot.setup_manager import SetupManager
+    return SetupManager()
+
+
+def start_match(params: List[str], sm: "SetupManager", out: mp.Queue, blobs: BlobCache):
+    from rlbot.setup_manager import RocketLeagueLauncherPreference
+
+    from .start_match_util import start_match_helper
+
+    bot_list = blobs.loads(params[1])
+    match_settings = blobs.loads(params[2])
 
     preferred_launcher = params[3]
     use_login_tricks = bool(params[4])
@@ -29,22 +106,60 @@ def start_match(params: List[str], sm: SetupManager, out: mp.Queue):
     start_match_helper(sm, bot_list, match_settings, RocketLeagueLauncherPreference(preferred_launcher, use_login_tricks, rocket_league_exe_path), out)
 
 
-def stop_match(sm: SetupManager):
+def prepare_match(params: List[str], preparer: "MatchPreparer", blobs: BlobCache):
+    from rlbot.setup_manager import RocketLeagueLauncherPreference
+
+    bot_list = blobs.loads(params[1])
+    match_settings = blobs.loads(params[2])
+
+    preferred_launcher = params[3]
+    use_login_tricks = bool(params[4])
+    if params[5] != "":
+        rocket_league_exe_path = Path(params[5])
+    else:
+        rocket_league_exe_path = None
+
+    preparer.prepare_async(bot_list, match_settings, RocketLeagueLauncherPreference(preferred_launcher, use_login_tricks, rocket_league_exe_path))
+
+
+def bot_stats(monitor: "BotMonitor"):
+    if not monitor.running:
+        # the first cpu numbers will be 0, later samples come from the monitor thread
+        monitor.sample()
+        monitor.start()
+    emit_event("BOT_STATS", monitor.stats())
+
+
+def stop_match(sm: "SetupManager"):
     if sm.has_started:
-        sm.shut_down(kill_all_pids=True)
+        from .teardown_util import shut_down_quickly
+
+        report = shut_down_quickly(sm)
+        emit_event("TEARDOWN", report)
 
 
-def fetch_gtp(sm: SetupManager):
-    print(f"-|-*|GTP {json.dumps(fetch_game_tick_packet(sm))}|*-|-", flush=True)
+def fetch_gtp(sm: "SetupManager", out: mp.Queue):
+    try:
+        from .showroom_util import fetch_game_tick_packet
+
+        emit_event("GTP", fetch_game_tick_packet(sm))
+    finally:
+        out.put("done")
 
 
-def set_state(params: List[str], sm: SetupManager):
-    state = json.loads(params[1])
+def set_state(params: List[str], sm: "SetupManager", blobs: BlobCache):
+    from .showroom_util import set_game_state
+
+    state = blobs.loads(params[1])
     set_game_state(sm, state)
 
 
-def spawn_view_car(params: List[str], sm: SetupManager):
-    config = json.loads(params[1])
+def spawn_view_car(params: List[str], sm: "SetupManager", blobs: BlobCache):
+    from rlbot.setup_manager import RocketLeagueLauncherPreference
+
+    from .showroom_util import spawn_car_for_viewing
+
+    config = blobs.loads(params[1])
     team = int(params[2])
     showcase_type = params[3]
     map_name = params[4]
@@ -59,15 +174,23 @@ def spawn_view_car(params: List[str], sm: SetupManager):
     spawn_car_for_viewing(sm, config, team, showcase_type, map_name, RocketLeagueLauncherPreference(preferred_launcher, use_login_tricks, rocket_league_exe_path))
 
 
-def launch_challenge(params: List[str], sm: SetupManager, out: mp.Queue):
+def launch_challenge(params: List[str], sm: "SetupManager", out: mp.Queue, blobs: BlobCache):
+    from rlbot.matchconfig.match_config import Team
+    from rlbot.setup_manager import RocketLeagueLauncherPreference
+
+    from .start_match_util import create_match_config
+    from .story_mode_util import (add_match_result, compact_attempts,
+                                  match_result_delta, run_challenge)
+
     challenge_id = params[1]
-    city_color = json.loads(params[2])
-    team_color = json.loads(params[3])
-    upgrades = json.loads(params[4])
-    bot_list = json.loads(params[5])
-    match_settings = json.loads(params[6])
-    challenge = json.loads(params[7])
-    save_state = json.loads(params[8])
+    city_color = blobs.loads(params[2])
+    team_color = blobs.loads(params[3])
+    upgrades = blobs.loads(params[4])
+    bot_list = blobs.loads(params[5])
+    match_settings = blobs.loads(params[6])
+    challenge = blobs.loads(params[7])
+    # the save state gets modified with the result
+    save_state = blobs.loads(params[8], mutable=True)
 
     preferred_launcher = params[9]
     use_login_tricks = bool(params[10])
@@ -86,16 +209,64 @@ def launch_challenge(params: List[str], sm: SetupManager, out: mp.Queue):
             elif city_color is not None:
                 config.loadout_config.team_color_id = city_color
 
+    # "full" sends back the whole save state, "delta" only sends what changed
+    result_mode = params[12] if len(params) > 12 and params[12] != "" else "full"
+    # if set, only the best and last N attempts of each challenge keep their game results
+    keep_attempts = int(params[13]) if len(params) > 13 and params[13] != "" else None
+
     completed, results = run_challenge(sm, match_config, challenge, upgrades, RocketLeagueLauncherPreference(preferred_launcher, use_login_tricks, rocket_league_exe_path), out)
 
-    save_state = add_match_result(save_state, challenge_id, completed, results)
+    if result_mode == "delta":
+        delta = match_result_delta(save_state, challenge_id, completed, results)
+        if keep_attempts is not None:
+            delta["compacted"] = compact_attempts(save_state, keep_attempts)
+        emit_event("STORY_RESULT_DELTA", delta)
+    else:
+        save_state = add_match_result(save_state, challenge_id, completed, results)
+        if keep_attempts is not None:
+            compact_attempts(save_state, keep_attempts)
+        emit_event("STORY_RESULT", save_state)
+
+
+def run_series(params: List[str], sm: "SetupManager", blobs: BlobCache) -> "SeriesRunner":
+    from rlbot.setup_manager import RocketLeagueLauncherPreference
 
-    print(f"-|-*|STORY_RESULT {json.dumps(save_state)}|*-|-", flush=True)
+    from .series_util import SeriesRunner
 
+    matches = blobs.loads(params[1])
 
-def match_handler(q: mp.Queue, out: mp.Queue):
-    sm = SetupManager()
+    preferred_launcher = params[2]
+    use_login_tricks = bool(params[3])
+    if params[4] != "":
+        rocket_league_exe_path = Path(params[4])
+    else:
+        rocket_league_exe_path = None
+
+    series = SeriesRunner(sm, RocketLeagueLauncherPreference(preferred_launcher, use_login_tricks, rocket_league_exe_path))
+    series.start(matches)
+    return series
+
+
+def match_handler(q: mp.Queue, out: mp.Queue, setup_manager_factory: Optional[Callable[[], "SetupManager"]] = None, warm_up: bool = True):
+    """
+    Run commands from q until shut down.
+    Nothing heavy is imported or created until a command needs it,
+    READY is printed as soon as commands can be taken, and then everything is imported in the background if warm_up is set
+    """
+    start = perf_counter()
+    # prints share stdout with the events, so they have to go through the same writer
+    capture_stdout()
+    sm = _Lazy(setup_manager_factory or _default_setup_manager)
+    blobs = BlobCache()
+    preparer = _Lazy(lambda: _import(".start_match_util", "prepare_match").MatchPreparer(sm.get()))
+    monitor = _Lazy(lambda: _import(".bot_monitor_util", "monitor_bots").BotMonitor(sm.get()))
+    series = None
     online = True
+    shut_down_deadline = None
+
+    emit_event("READY", {"seconds": perf_counter() - start})
+    if warm_up:
+        Thread(target=prewarm, daemon=True).start()
 
     while online:
         command = q.get()
@@ -105,48 +276,139 @@ def match_handler(q: mp.Queue, out: mp.Queue):
             continue
 
         try:
-            if params[0] == "start_match":
-                Thread(target=start_match, args=(params, sm, out)).start()
+            import_command_modules(params[0])
+
+            # put_blob's JSON isn't made of params, so it could look like it has some
+            missing_blobs = blobs.missing(params[1:]) if params[0] != "put_blob" else []
+            if len(missing_blobs) > 0:
+                # the blobs have to be sent again with put_blob before retrying the command
+                emit_event("BLOB_MISSING", missing_blobs)
+                out.put("blob_missing")
+                continue
+
+            # commands on other threads read their blobs later, by then a put_blob could have evicted them
+            pinned_blobs = blobs.pin(params[1:])
+
+            if params[0] == "put_blob":
+                try:
+                    # the JSON itself can contain the separator
+                    blobs.put(params[1], " | ".join(params[2:]))
+                except Exception as e:
+                    # the blob wasn't stored, so commands using it would just get BLOB_MISSING
+                    emit_event("BLOB_REJECTED", {"hash": params[1].strip() if len(params) > 1 else "", "error": str(e)})
+                    out.put("blob_rejected")
+                else:
+                    out.put("done")
+            elif params[0] == "start_match":
+                Thread(target=start_match, args=(params, sm.get(), out, pinned_blobs)).start()
+            elif params[0] == "prepare_match":
+                prepare_match(params, preparer.get(), blobs)
+                out.put("done")
+            elif params[0] == "commit_match":
+                Thread(target=preparer.get().commit, args=(out,)).start()
+            elif params[0] == "monitor_bots":
+                try:
+                    bot_monitor = monitor.get()
+                    bot_monitor.configure(json.loads(params[1]))
+                    if bot_monitor.report or bot_monitor.max_cpu_percent is not None or bot_monitor.max_rss_mb is not None:
+                        bot_monitor.start()
+                    else:
+                        bot_monitor.stop()
+                finally:
+                    out.put("done")
+            elif params[0] == "bot_stats":
+                try:
+                    bot_stats(monitor.get())
+                finally:
+                    out.put("done")
             elif params[0] == "kill_bots":
-                stop_match(sm)
+                if series is not None:
+                    # wait for it, it could still be launching bots
+                    series.stop()
+                    series = None
+                if sm.made:
+                    stop_match(sm.get())
+                if monitor.made:
+                    monitor.get().reset()
                 out.put("done")
             elif params[0] == "shut_down":
                 print("Got shut down signal")
+                if series is not None:
+                    series.stop()
+                if preparer.made:
+                    preparer.get().discard()
+                if monitor.made:
+                    monitor.get().stop()
                 online = False
+                # listen starts counting once it gets the reply, so this ends a bit before it gives up
+                shut_down_deadline = perf_counter() + SHUT_DOWN_SECONDS
                 out.put("shut_down")
             elif params[0] == "fetch_gtp":
-                Thread(target=fetch_gtp, args=(sm,)).start()
+                Thread(target=fetch_gtp, args=(sm.get(), out)).start()
             elif params[0] == "set_state":
-                Thread(target=set_state, args=(params, sm)).start()
+                Thread(target=set_state, args=(params, sm.get(), pinned_blobs)).start()
                 out.put("done")
             elif params[0] == "spawn_car_for_viewing":
-                Thread(target=spawn_view_car, args=(params, sm)).start()
+                Thread(target=spawn_view_car, args=(params, sm.get(), pinned_blobs)).start()
+                out.put("done")
+            elif params[0] == "run_series":
+                if series is not None:
+                    # two series can't set up matches on the same SetupManager at once
+                    series.stop()
+                series = run_series(params, sm.get(), blobs)
                 out.put("done")
             elif params[0] == "launch_challenge":
-                Thread(target=launch_challenge, args=(params, sm, out)).start()
+                Thread(target=launch_challenge, args=(params, sm.get(), out, pinned_blobs)).start()
+            elif params[0] == "import_times":
+                try:
+                    emit_event("IMPORT_TIMES", dict(_import_times))
+                finally:
+                    out.put("done")
         except Exception:
             print_exc()
-    stop_match(sm)
+
+    if sm.made:
+        stop_match(sm.get())
+
+    # the process exits right after this, taking the writer thread with it
+    flush_events(timeout=max(0, shut_down_deadline - perf_counter()))
 
 
-def listen(is_raw_json=True):
-    if not is_raw_json:
-        from base64 import standard_b64decode
-        from gzip import decompress
+def close_match_handler(match_handler_thread: mp.Process, timeout: float = SHUT_DOWN_SECONDS):
+    """Give the match handler a moment to shut down on its own, then make it"""
+    match_handler_thread.join(timeout=timeout)
+    if match_handler_thread.is_alive():
+        print(f"Match handler thread is still alive after {timeout} seconds, terminating it")
+        match_handler_thread.terminate()
+        match_handler_thread.join(timeout=1)
+
+    if match_handler_thread.is_alive():
+        print("Match handler thread didn't terminate, killing it")
+        if hasattr(match_handler_thread, "kill"):
+            match_handler_thread.kill()
+        else:
+            # Process.kill is new in 3.7, on Windows terminate already kills
+            os.kill(match_handler_thread.pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+
+
+def listen(is_raw_json=True, compression=GZIP, use_dictionary=True, warm_up=True):
+    """
+    Run commands from stdin until shut down.
+    If the commands aren't raw json, compression picks how they are encoded, see command_stream.
+    warm_up imports everything in the background once the match handler is READY
+    """
+    commands = read_commands(sys.stdin, RAW if is_raw_json else compression, use_dictionary)
 
     stdin_queue = mp.Queue()
     out_queue = mp.Queue()
-    match_handler_thread = mp.Process(target=match_handler, args=(stdin_queue, out_queue))
+    match_handler_thread = mp.Process(target=match_handler, args=(stdin_queue, out_queue, None, warm_up))
     match_handler_thread.start()
 
     online = True
     while online:
         try:
-            line = sys.stdin.readline()
-
-            if not is_raw_json:
-                # if the command is not raw json, then it must be decoded
-                line = decompress(standard_b64decode(line)).decode("utf-8")
+            # once stdin closes this raises StopIteration, which shuts everything down
+            line = next(commands)
 
             stdin_queue.put(str(line))
             if out_queue.get() == "shut_down":
@@ -156,45 +418,94 @@ def listen(is_raw_json=True):
             online = False
 
     print("Closing...")
-    match_handler_thread.join(timeout=60)
-    if match_handler_thread.is_alive():
-        print("Match handler thread is still alive after 60 seconds, killing it")
-        match_handler_thread.terminate()
+    close_match_handler(match_handler_thread)
 
     exit()
 
-def from_file(file_path: str, is_raw_json: bool=True):
-    from time import sleep
+def from_file(file_path: str, is_raw_json: bool=True, rate: float=1, repeat: int=1, reply_timeout: float=60, wait_for_exit: bool=True):
+    """
+    Replay a script of commands from <file_path>.txt, then print how long the replies took.
+    Every line is a command, except for lines starting with #:
+    "#sleep <seconds>" waits before the next command (divided by rate), other # lines are comments.
+    """
+    from queue import Empty
+    from time import perf_counter, sleep
 
-    if not is_raw_json:
-        from base64 import standard_b64decode
-        from gzip import decompress
+    from .benchmark_util import print_latency_table
 
     # do listen but instead of reading from sys.stdin, read from a file as set by the first argument
     # when CTRL+C is pressed, treat it as if "shut_down | " was read from stdin
 
+    with open(file_path + ".txt", "r") as f:
+        script = [line for line in f if line.strip()]
+
     stdin_queue = mp.Queue()
     out_queue = mp.Queue()
     match_handler_thread = mp.Process(target=match_handler, args=(stdin_queue, out_queue))
     match_handler_thread.start()
 
-    with open(file_path + ".txt", "r") as f:
-        command = f.readline()
+    latencies = {}
+    timeouts = 0
+    online = True
+    stopped = False
 
-    if not is_raw_json:
-        command = decompress(standard_b64decode(command)).decode("utf-8")
+    try:
+        for _ in range(repeat):
+            for line in script:
+                if line.startswith("#"):
+                    directive = line[1:].split()
+                    if len(directive) == 2 and directive[0] == "sleep":
+                        sleep(float(directive[1]) / rate)
+                    continue
+
+                command = line if is_raw_json else decode_gzip_line(line)
+                name = command.split(" | ")[0].strip()
+
+                start = perf_counter()
+                stdin_queue.put(str(command))
+                try:
+                    reply = out_queue.get(timeout=reply_timeout)
+                except Empty:
+                    print(f"No reply to {name} after {reply_timeout} seconds")
+                    timeouts += 1
+
+                    # the late reply would be taken as the reply to the next command, so wait it out untimed
+                    try:
+                        reply = out_queue.get(timeout=reply_timeout)
+                    except Empty:
+                        print(f"Still no reply to {name}, stopping the replay")
+                        stopped = True
+                        break
+
+                    if reply == "shut_down":
+                        online = False
+                        break
+                    continue
+
+                latencies.setdefault(name, []).append(perf_counter() - start)
+                if reply == "shut_down":
+                    online = False
+                    break
+
+            if not online or stopped:
+                break
+    except BaseException:
+        # stop replaying, but still show what was measured so far
+        wait_for_exit = False
 
-    stdin_queue.put(str(command))
+    print_latency_table(latencies)
+    if timeouts > 0:
+        print(f"{timeouts} commands got no reply")
 
     # wait for an error (e.x. KeyboardInterrupt or CTRL+C)
     try:
-        while True:
+        while online and wait_for_exit:
             sleep(1)
     except BaseException:
+        pass
+
+    if online:
         stdin_queue.put("shut_down | ")
 
     print("Closing...")
-    match_handler_thread.join(timeout=60)
-    if match_handler_thread.is_alive():
-        print("Match handler thread is still alive after 60 seconds, killing it")
-        match_handler_thread.terminate()
+    close_match_handler(match_handler_thread)
@@ -0,0 +1,158 @@
+import random
+import time
+from threading import Event, Thread, current_thread
+from traceback import print_exc
+from typing import List, Optional
+
+from rlbot.matchconfig.match_config import MatchConfig
+from rlbot.setup_manager import RocketLeagueLauncherPreference, SetupManager
+from rlbot.utils import logging_utils
+from rlbot.utils.structures.game_data_struct import GameTickPacket
+
+from .event_writer import emit_event
+from .start_match_util import create_match_config, is_custom_map, setup_match
+from .story_mode_util import get_team_scores
+from .teardown_util import shut_down_quickly
+
+SERIES_WITNESS_ID = random.randint(0, 1e5)
+
+logger = logging_utils.get_logger("series")
+
+
+def _bot_signature(bot_list: List[dict]) -> list:
+    # compare what was asked for, psyonix bots get a random name once the config is made
+    return [(bot["name"], bot["team"], bot["runnable_type"], bot.get("path")) for bot in bot_list]
+
+
+class SeriesRunner:
+    """
+    Runs a list of matches back to back on one SetupManager.
+    When the next match has the same bots, the bot processes are kept alive and the match is just restarted.
+    """
+
+    def __init__(self, sm: SetupManager, launcher_pref: RocketLeagueLauncherPreference):
+        self._sm = sm
+        self._launcher_pref = launcher_pref
+        self._stop_event = Event()
+        self._previous_config: Optional[MatchConfig] = None
+        self._previous_bots: Optional[list] = None
+        self._thread: Optional[Thread] = None
+
+    def start(self, matches: List[dict], match_timeout: float = 3600):
+        """Run the series on its own thread"""
+        self._thread = Thread(target=self.run, args=(matches, match_timeout))
+        self._thread.start()
+
+    def stop(self, timeout: float = 30) -> bool:
+        """
+        Stop after the current match, or before the next one starts.
+        Waits up to timeout seconds for the series thread to let go of the SetupManager, returns False if it didn't
+        """
+        self._stop_event.set()
+
+        if self._thread is None or self._thread is current_thread():
+            return True
+
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.warning(f"The series is still busy after {timeout} seconds")
+            return False
+        return True
+
+    def _can_reuse_bots(self, match_config: MatchConfig, bots: list) -> bool:
+        if self._previous_config is None or bots != self._previous_bots:
+            return False
+
+        # scripts are launched again every time, so only reuse if there aren't any
+        if match_config.script_configs or self._previous_config.script_configs:
+            return False
+
+        # custom maps have to be swapped in (and can bring their own script), which only setup_match does
+        if is_custom_map(match_config.game_map):
+            return False
+
+        return all(process.is_alive() for process in self._sm.bot_processes.values())
+
+    def _start(self, match_config: MatchConfig, bots: list) -> bool:
+        """Returns True if the bot processes were reused"""
+        if self._can_reuse_bots(match_config, bots):
+            # the bots retire if their spawn id changes, so keep the old ones
+            # psyonix bots also keep their looks and names
+            match_config.player_configs = self._previous_config.player_configs
+
+            self._sm.load_match_config(match_config)
+            self._sm.start_match()
+            return True
+
+        if self._previous_config is not None:
+            shut_down_quickly(self._sm)
+
+        setup_match(self._sm, match_config, self._launcher_pref)
+        return False
+
+    def _wait_for_match_end(self, packet: GameTickPacket, timeout: float) -> bool:
+        """Returns False if the match went away before it ended"""
+        game_interface = self._sm.game_interface
+        start = time.monotonic()
+
+        # the previous match might still be on the winner screen
+        game_interface.fresh_live_data_packet(packet, 1000, SERIES_WITNESS_ID)
+        while packet.game_info.is_match_ended and time.monotonic() - start < 30:
+            game_interface.fresh_live_data_packet(packet, 1000, SERIES_WITNESS_ID)
+
+        while not packet.game_info.is_match_ended:
+            if packet.num_cars == 0 or self._stop_event.is_set() or time.monotonic() - start > timeout:
+                return False
+            game_interface.fresh_live_data_packet(packet, 1000, SERIES_WITNESS_ID)
+
+        return True
+
+    def run(self, matches: List[dict], match_timeout: float = 3600):
+        """
+        matches is a list of {"bot_list": [...], "match_settings": {...}}, like the params of start_match.
+        A SERIES_RESULT is printed after every match, and SERIES_DONE at the end
+        """
+        series_start = time.monotonic()
+        packet = GameTickPacket()
+        played = 0
+
+        for index, match in enumerate(matches):
+            if self._stop_event.is_set():
+                break
+
+            match_start = time.monotonic()
+            match_config = create_match_config(match["bot_list"], match["match_settings"])
+            bots = _bot_signature(match["bot_list"])
+
+            try:
+                bots_reused = self._start(match_config, bots)
+                self._previous_config = match_config
+                self._previous_bots = bots
+                ended = self._wait_for_match_end(packet, match_timeout)
+            except Exception:
+                print_exc()
+                logger.warning(f"Match {index} of the series failed, stopping the series")
+                break
+
+            played += 1
+            record = {
+                "index": index,
+                "completed": ended,
+                "scores": get_team_scores(packet)[:packet.num_teams],
+                "game_seconds": packet.game_info.seconds_elapsed,
+                "wall_seconds": time.monotonic() - match_start,
+                "bots_reused": bots_reused,
+            }
+            emit_event("SERIES_RESULT", record)
+
+            if not ended:
+                logger.warning(f"Match {index} of the series didn't finish, stopping the series")
+                break
+
+        wall_seconds = time.monotonic() - series_start
+        summary = {
+            "matches": played,
+            "wall_seconds": wall_seconds,
+            "matches_per_hour": played / wall_seconds * 3600 if wall_seconds > 0 else 0,
+        }
+        emit_event("SERIES_DONE", summary)
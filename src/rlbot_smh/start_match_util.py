@@ -1,3 +1,5 @@
+from contextlib import ExitStack
+from threading import Lock, Thread
 from time import sleep
 from traceback import print_exc
 from typing import List, Optional
@@ -13,6 +15,7 @@ from rlbot.setup_manager import RocketLeagueLauncherPreference, SetupManager
 from rlbot.utils import logging_utils
 
 from .custom_map_util import identify_map_directory, prepare_custom_map
+from .event_writer import emit_event
 
 logger = logging_utils.get_logger("match_handler")
 
@@ -42,60 +45,145 @@ def create_script_config(script):
     return ScriptConfig(script['path'])
 
 
-def setup_match(
-    setup_manager: SetupManager, match_config: MatchConfig, launcher_pref: RocketLeagueLauncherPreference, out: Optional[mp.Queue] = None
-):
-    """Starts the match and bots. Also detects and handles custom maps"""
+def is_custom_map(map_name: str) -> bool:
+    return map_name.endswith('.upk') or map_name.endswith('.udk')
 
-    def do_setup():
-        setup_manager.early_start_seconds = 5
-        setup_manager.connect_to_game(launcher_preference=launcher_pref)
-
-        # Loading the setup manager's game interface just as a quick fix because story mode uses it. Ideally story mode
-        # should now make its own game interface to use.
-        setup_manager.game_interface.load_interface(wants_ball_predictions=False, wants_quick_chat=False, wants_game_messages=False)
-        setup_manager.load_match_config(match_config)
-        setup_manager.launch_early_start_bot_processes()
-        setup_manager.start_match()
-        setup_manager.launch_bot_processes()
-
-        if out is not None:
-            out.put("done")
-
-        logger.info("Waiting to recieve metadata from all bots...")
-
-        times_waited = 0
-        # wait for all metadata, or for 10 seconds
-        while not setup_manager.has_received_metadata_from_all_bots() and times_waited < 40:
-            if times_waited != 0:
-                expected_metadata = sum(1 for player in setup_manager.match_config.player_configs if player.rlbot_controlled)
-                needed_metadata = expected_metadata - setup_manager.num_metadata_received
-                logger.info(f"Waiting for metadata from {needed_metadata} bot{'s' if needed_metadata > 1 else ''}...")
-                sleep(0.25)
-            times_waited += 1
-            setup_manager.try_recieve_agent_metadata()
-
-        if not setup_manager.has_received_metadata_from_all_bots():
-            expected_metadata = sum(1 for player in setup_manager.match_config.player_configs if player.rlbot_controlled)
-            logger.warning(f"Did not receive metadata from all bots. Expected {expected_metadata} but only got {setup_manager.num_metadata_received}")
 
+def _stage_custom_map(match_config: MatchConfig, launcher_pref: RocketLeagueLauncherPreference, stack: ExitStack):
+    """If the map is a custom one, swap it in until the stack is closed"""
     map_file = match_config.game_map
-    if map_file.endswith('.upk') or map_file.endswith('.udk'):
-        rl_directory = identify_map_directory(launcher_pref)
+    if not is_custom_map(map_file):
+        return
+
+    rl_directory = identify_map_directory(launcher_pref)
+
+    if not rl_directory:
+        raise Exception("Couldn't find path to Rocket League maps folder")
+
+    map_file, metadata = stack.enter_context(prepare_custom_map(map_file, rl_directory))
+    match_config.game_map = map_file
+    if "config_path" in metadata:
+        config_path = metadata["config_path"]
+        match_config.script_configs.append(
+            create_script_config({'path': config_path}))
+        logger.info(f"Will load custom script for map {config_path}")
+
+
+def _connect_to_game(setup_manager: SetupManager, match_config: MatchConfig, launcher_pref: RocketLeagueLauncherPreference):
+    setup_manager.early_start_seconds = 5
+    setup_manager.connect_to_game(launcher_preference=launcher_pref)
+
+    # Loading the setup manager's game interface just as a quick fix because story mode uses it. Ideally story mode
+    # should now make its own game interface to use.
+    setup_manager.game_interface.load_interface(wants_ball_predictions=False, wants_quick_chat=False, wants_game_messages=False)
+    setup_manager.load_match_config(match_config)
 
-        if not rl_directory:
-            raise Exception("Couldn't find path to Rocket League maps folder")
 
-        with prepare_custom_map(map_file, rl_directory) as (map_file, metadata):
-            match_config.game_map = map_file
-            if "config_path" in metadata:
-                config_path = metadata["config_path"]
-                match_config.script_configs.append(
-                    create_script_config({'path': config_path}))
-                logger.info(f"Will load custom script for map {config_path}")
-            do_setup()
-    else:
-        do_setup()
+def _launch_match(setup_manager: SetupManager, out: Optional[mp.Queue] = None):
+    setup_manager.launch_early_start_bot_processes()
+    setup_manager.start_match()
+    setup_manager.launch_bot_processes()
+
+    if out is not None:
+        out.put("done")
+
+    logger.info("Waiting to recieve metadata from all bots...")
+
+    times_waited = 0
+    # wait for all metadata, or for 10 seconds
+    while not setup_manager.has_received_metadata_from_all_bots() and times_waited < 40:
+        if times_waited != 0:
+            expected_metadata = sum(1 for player in setup_manager.match_config.player_configs if player.rlbot_controlled)
+            needed_metadata = expected_metadata - setup_manager.num_metadata_received
+            logger.info(f"Waiting for metadata from {needed_metadata} bot{'s' if needed_metadata > 1 else ''}...")
+            sleep(0.25)
+        times_waited += 1
+        setup_manager.try_recieve_agent_metadata()
+
+    if not setup_manager.has_received_metadata_from_all_bots():
+        expected_metadata = sum(1 for player in setup_manager.match_config.player_configs if player.rlbot_controlled)
+        logger.warning(f"Did not receive metadata from all bots. Expected {expected_metadata} but only got {setup_manager.num_metadata_received}")
+
+
+def setup_match(
+    setup_manager: SetupManager, match_config: MatchConfig, launcher_pref: RocketLeagueLauncherPreference, out: Optional[mp.Queue] = None
+):
+    """Starts the match and bots. Also detects and handles custom maps"""
+    with ExitStack() as stack:
+        _stage_custom_map(match_config, launcher_pref, stack)
+        _connect_to_game(setup_manager, match_config, launcher_pref)
+        _launch_match(setup_manager, out)
+
+
+class MatchPreparer:
+    """
+    Splits starting a match in two.
+    prepare() does everything that doesn't start the match (parsing configs, staging custom maps,
+    connecting to the game) while the user is still in the lobby, so commit() only has to start it.
+    """
+
+    def __init__(self, setup_manager: SetupManager):
+        self._setup_manager = setup_manager
+        self._lock = Lock()
+        self._prepare_thread: Optional[Thread] = None
+        self._match_config: Optional[MatchConfig] = None
+        self._map_stack = ExitStack()
+
+    def prepare_async(self, bot_list: List[dict], match_settings: dict, launcher_prefs: RocketLeagueLauncherPreference):
+        """Prepare in the background. A commit() after this waits for it to finish"""
+        self._prepare_thread = Thread(target=self.prepare, args=(bot_list, match_settings, launcher_prefs))
+        self._prepare_thread.start()
+
+    def prepare(self, bot_list: List[dict], match_settings: dict, launcher_prefs: RocketLeagueLauncherPreference):
+        with self._lock:
+            # preparing again replaces whatever was prepared before
+            self._discard()
+
+            try:
+                match_config = create_match_config(bot_list, match_settings)
+                _stage_custom_map(match_config, launcher_prefs, self._map_stack)
+                _connect_to_game(self._setup_manager, match_config, launcher_prefs)
+                self._match_config = match_config
+                emit_event("MATCH PREPARED")
+            except Exception:
+                print_exc()
+                self._discard()
+                emit_event("MATCH PREPARE FAILED")
+
+    def commit(self, out: Optional[mp.Queue] = None):
+        prepare_thread = self._prepare_thread
+        if prepare_thread is not None:
+            prepare_thread.join()
+
+        with self._lock:
+            if self._match_config is None:
+                logger.warning("There's no prepared match to start")
+                emit_event("MATCH START FAILED")
+                if out is not None:
+                    out.put("done")
+                return
+
+            try:
+                if self._setup_manager.match_config is not self._match_config:
+                    # another command loaded a different config since
+                    self._setup_manager.load_match_config(self._match_config)
+                _launch_match(self._setup_manager, out)
+                emit_event("MATCH STARTED")
+            except Exception:
+                print_exc()
+                emit_event("MATCH START FAILED")
+            finally:
+                self._discard()
+
+    def discard(self):
+        with self._lock:
+            self._discard()
+
+    def _discard(self):
+        self._match_config = None
+        # puts back the original map, if a custom one was staged
+        self._map_stack.close()
+        self._map_stack = ExitStack()
 
 
 def create_match_config(bot_list: List[dict], match_settings: dict) -> MatchConfig:
@@ -144,10 +232,10 @@ def start_match_wrapper(sm: SetupManager, match_config: MatchConfig, launcher_pr
 
     try:
         setup_match(sm, match_config, launcher_prefs, out)
-        print("-|-*|MATCH STARTED|*-|-", flush=True)
+        emit_event("MATCH STARTED")
     except Exception:
         print_exc()
-        print("-|-*|MATCH START FAILED|*-|-", flush=True)
+        emit_event("MATCH START FAILED")
 
 
 def start_match_helper(sm: SetupManager, bot_list: List[dict], match_settings: dict, launcher_prefs: RocketLeagueLauncherPreference, out: Optional[mp.Queue] = None):
@@ -4,7 +4,7 @@ import time
 from datetime import datetime
 from multiprocessing import Queue as MPQueue
 from traceback import print_exc
-from typing import Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 
 from rlbot.matchconfig.match_config import MatchConfig, MutatorConfig
 from rlbot.parsing.match_settings_config_parser import (game_mode_types,
@@ -13,6 +13,7 @@ from rlbot.setup_manager import RocketLeagueLauncherPreference, SetupManager
 from rlbot.utils.game_state_util import CarState, GameState
 from rlbot.utils.structures.game_data_struct import GameTickPacket
 
+from .event_writer import emit_event
 from .start_match_util import start_match_wrapper
 
 WITNESS_ID = random.randint(0, 1e5)
@@ -20,7 +21,10 @@ RENDERING_GROUP = "STORY"
 
 DEBUG_MODE_SHORT_GAMES = False
 
-def setup_failure_freeplay(setup_manager: SetupManager, message: str, color_key="red"):
+def setup_failure_freeplay(
+    setup_manager: SetupManager, message: str, color_key="red",
+    sleep: Callable[[float], None] = time.sleep, clock: Callable[[], float] = time.monotonic
+):
     setup_manager.shut_down()
     match_config = MatchConfig()
     match_config.game_mode = game_mode_types[0]
@@ -37,7 +41,7 @@ def setup_failure_freeplay(setup_manager: SetupManager, message: str, color_key=
     setup_manager.start_match()
 
     # wait till num players is 0
-    wait_till_cars_spawned(setup_manager, 0)
+    wait_till_cars_spawned(setup_manager, 0, sleep, clock)
 
     color = getattr(setup_manager.game_interface.renderer, color_key)()
     setup_manager.game_interface.renderer.begin_rendering(RENDERING_GROUP)
@@ -46,6 +50,23 @@ def setup_failure_freeplay(setup_manager: SetupManager, message: str, color_key=
     setup_manager.game_interface.renderer.end_rendering()
 
 
+def get_team_scores(game_tick_packet: GameTickPacket) -> List[dict]:
+    """[{team_index, score}] for each team in the packet"""
+    if platform.system() == "Windows":
+        # team_index = gamePacket.teams[i].team_index
+        # new_score = gamePacket.teams[i].score
+        return [
+            {"team_index": t.team_index, "score": t.score} for t in game_tick_packet.teams
+        ]
+
+    # gotta love them bugs! juicy!!!
+    # team_index = gamePacket.teams[i].score - 1
+    # new_score = gamePacket.teams[i].team_index
+    return [
+        {"team_index": t.score - 1, "score": t.team_index} for t in game_tick_packet.teams
+    ]
+
+
 def packet_to_game_results(game_tick_packet: GameTickPacket):
     """Take the final game_tick_packet and
     returns the info related to the final game results
@@ -72,20 +93,7 @@ def packet_to_game_results(game_tick_packet: GameTickPacket):
     ]
 
 
-    if platform.system() == "Windows":
-        # team_index = gamePacket.teams[i].team_index
-        # new_score = gamePacket.teams[i].score
-        scores_sorted = [
-            {"team_index": t.team_index, "score": t.score} for t in game_tick_packet.teams
-        ]
-    else:
-        # gotta love them bugs! juicy!!!
-        # team_index = gamePacket.teams[i].score - 1
-        # new_score = gamePacket.teams[i].team_index
-        scores_sorted = [
-            {"team_index": t.score - 1, "score": t.team_index} for t in game_tick_packet.teams
-        ]
-
+    scores_sorted = get_team_scores(game_tick_packet)
     scores_sorted.sort(key=lambda x: x["score"], reverse=True)
     human_won = scores_sorted[0]["team_index"] == human_player.team
 
@@ -98,33 +106,126 @@ def packet_to_game_results(game_tick_packet: GameTickPacket):
     }
 
 
+MERCY_DIFFERENCE = 5
+
+
+def _score_difference(results) -> int:
+    # ignore the team, just look at the differential
+    return results["score"][0]["score"] - results["score"][1]["score"]
+
+
+class _ConditionCheck:
+    """
+    A single compiled condition. The check is only re-run when the value it reads changes.
+    `monotonic` is true when the value can never go back down, so once met it stays met.
+    """
+    __slots__ = ("_get_value", "_is_met", "monotonic", "met", "_last_value")
+
+    def __init__(self, get_value, is_met, monotonic: bool):
+        self._get_value = get_value
+        self._is_met = is_met
+        self.monotonic = monotonic
+        self.met = False
+        self._last_value = None
+
+    def update(self, manual_stats, results):
+        value = self._get_value(manual_stats, results)
+        if value != self._last_value:
+            self._last_value = value
+            self.met = self._is_met(value)
+
+
+def _stat_at_least(stat: str, target: int) -> _ConditionCheck:
+    return _ConditionCheck(lambda manual_stats, _: manual_stats[stat], lambda value: value >= target, True)
+
+
+class ChallengeEvaluator:
+    """
+    completionConditions compiled once into a list of checks.
+    All completion checks are "and", and any failure check perma-fails the challenge.
+    """
+
+    def __init__(self, challenge):
+        self._failure_checks = []
+        self._completion_checks = []
+
+        conditions = challenge.get("completionConditions")
+
+        if conditions is None or conditions.get("win", True):
+            self._completion_checks.append(_ConditionCheck(lambda _, results: results["human_won"], bool, False))
+
+        if conditions is None:
+            return
+
+        if "selfDemoCount" in conditions:
+            allowed_demos = conditions["selfDemoCount"]
+            self._failure_checks.append(
+                _ConditionCheck(lambda manual_stats, _: manual_stats["recievedDemos"], lambda demos: demos > allowed_demos, True)
+            )
+
+        if "scoreDifference" in conditions:
+            min_difference = conditions["scoreDifference"]
+            self._completion_checks.append(
+                _ConditionCheck(lambda _, results: _score_difference(results), lambda difference: difference >= min_difference, False)
+            )
+
+        if "demoAchievedCount" in conditions:
+            self._completion_checks.append(_stat_at_least("opponentRecievedDemos", conditions["demoAchievedCount"]))
+
+        if "goalsScored" in conditions:
+            self._completion_checks.append(_stat_at_least("humanGoalsScored", conditions["goalsScored"]))
+
+    def update(self, manual_stats, results=None):
+        """
+        Re-evaluate the checks against the latest stats.
+        Completion checks are skipped if there are no results yet
+        """
+        for check in self._failure_checks:
+            check.update(manual_stats, results)
+
+        if results is not None:
+            for check in self._completion_checks:
+                check.update(manual_stats, results)
+
+    @property
+    def perma_failed(self) -> bool:
+        """More time in the game can't change the result"""
+        return any(check.met for check in self._failure_checks)
+
+    @property
+    def completed(self) -> bool:
+        return not self.perma_failed and all(check.met for check in self._completion_checks)
+
+    @property
+    def already_satisfied(self) -> bool:
+        """Completed, and more time in the game can't undo it"""
+        # a failure check can still trip later, and with no completion checks there's nothing to have happened yet
+        if self._failure_checks or not self._completion_checks:
+            return False
+        return self.completed and all(check.monotonic for check in self._completion_checks)
+
+    def end_by_mercy(self, results) -> bool:
+        """Returns true if the human team is ahead by a lot
+        and the other challenges have finished"""
+        return _score_difference(results) >= MERCY_DIFFERENCE and self.completed
+
+
 def has_user_perma_failed(challenge, manual_stats):
     """
     Check if the user has perma-failed the challenge
     meaning more time in the game doesn't change the result
     """
-    if "completionConditions" not in challenge:
-        return False
-    failed = False
-    completionConditions = challenge["completionConditions"]
-
-    if "selfDemoCount" in completionConditions:
-        survived = (
-            manual_stats["recievedDemos"] <= completionConditions["selfDemoCount"]
-        )
-        failed = failed or not survived
-    return failed
+    evaluator = ChallengeEvaluator(challenge)
+    evaluator.update(manual_stats)
+    return evaluator.perma_failed
+
 
 def end_by_mercy(challenge, manual_stats, results):
     """Returns true if the human team is ahead by a lot
     and the other challenges have finished"""
-    challenge_completed = calculate_completion(challenge, manual_stats, results)
-
-    mercy_difference = 5
-    # ignore the team, just look at the differential
-    score_differential = results["score"][0]["score"] - results["score"][1]["score"]
-
-    return score_differential >= mercy_difference and challenge_completed
+    evaluator = ChallengeEvaluator(challenge)
+    evaluator.update(manual_stats, results)
+    return evaluator.end_by_mercy(results)
 
 
 def calculate_completion(challenge, manual_stats, results):
@@ -133,37 +234,9 @@ def calculate_completion(challenge, manual_stats, results):
     each.
     All conditions are "and"
     """
-    completed = results["human_won"]
-    if "completionConditions" not in challenge:
-        return completed
-
-    if has_user_perma_failed(challenge, manual_stats):
-        return False
-
-    completionConditions = challenge["completionConditions"]
-
-    if not completionConditions.get("win", True):
-        # the "win" requirement is explicitly off
-        completed = True
-
-    if "scoreDifference" in completionConditions:
-        # ignore the team, jsut look at the differential
-        condition = completionConditions["scoreDifference"]
-        difference = results["score"][0]["score"] - results["score"][1]["score"]
-        completed = completed and (difference >= condition)
-
-    if "demoAchievedCount" in completionConditions:
-        achieved = (
-            manual_stats["opponentRecievedDemos"]
-            >= completionConditions["demoAchievedCount"]
-        )
-        completed = completed and achieved
-
-    if "goalsScored" in completionConditions:
-        achieved = manual_stats["humanGoalsScored"] >= completionConditions["goalsScored"]
-        completed = completed and achieved
-
-    return completed
+    evaluator = ChallengeEvaluator(challenge)
+    evaluator.update(manual_stats, results)
+    return evaluator.completed
 
 
 class ManualStatsTracker:
@@ -202,8 +275,8 @@ class ManualStatsTracker:
                     self.stats["opponentRecievedDemos"] += 1
 
         touch = gamePacket.game_ball.latest_touch
-        team = touch.team
-        self._last_touch_by_team[team] = touch
+        # the packet buffer gets reused, so copy out what we need instead of keeping the struct
+        self._last_touch_by_team[touch.team] = (touch.player_index, touch.player_name)
 
         for i in range(2):  # iterate of [{team_index, score}]
             if platform.system() == "Windows":
@@ -214,44 +287,146 @@ class ManualStatsTracker:
                 team_index = gamePacket.teams[i].score - 1
                 new_score = gamePacket.teams[i].team_index
             if new_score != self._last_score_by_team[team_index]:
+                # more than one goal can show up at once if packets were skipped
+                goals = new_score - self._last_score_by_team[team_index]
                 self._last_score_by_team[team_index] = new_score
 
-                if self._last_touch_by_team[team_index] is not None:
-                    last_touch_player = self._last_touch_by_team[team_index].player_index
-                    last_touch_player_name = self._last_touch_by_team[team_index].player_name
+                if self._last_touch_by_team[team_index] is not None and goals > 0:
+                    last_touch_player, last_touch_player_name = self._last_touch_by_team[team_index]
                     if not gamePacket.game_cars[last_touch_player].is_bot and last_touch_player_name != "":
-                        self.stats["humanGoalsScored"] += 1
+                        self.stats["humanGoalsScored"] += goals
                         print("humanGoalsScored")
 
 
+class TickCounter:
+    """
+    Keeps track of the game frames seen by the story loop,
+    so skipped or repeated packets don't go unnoticed
+    """
+
+    def __init__(self, first_frame: int):
+        self.ticks = 0
+        self.dropped = 0
+        self.duplicated = 0
+        self._last_frame = first_frame
+
+    def update(self, frame_num: int) -> int:
+        """Returns how many frames have passed since the last packet, 0 for a repeated packet"""
+        if frame_num < self._last_frame:
+            # the frame count was reset, there's nothing to compare against
+            advanced = 1
+        else:
+            advanced = frame_num - self._last_frame
+        self._last_frame = frame_num
+
+        if advanced == 0:
+            self.duplicated += 1
+        else:
+            self.ticks += 1
+            self.dropped += advanced - 1
+
+        return advanced
+
+    def as_dict(self) -> dict:
+        return {
+            "ticks": self.ticks,
+            "dropped": self.dropped,
+            "duplicated": self.duplicated,
+        }
+
+    def report(self):
+        print(f"Story mode processed {self.ticks} ticks, {self.dropped} dropped, {self.duplicated} duplicated")
+        if self.dropped > 0:
+            print("WARNING: Some game frames were skipped, story mode stats may be inaccurate")
+
+
+class StateWriter:
+    """
+    Merges the per-car state adjustments of a tick into at most one set_game_state call.
+    Setting the state is asynchronous, so an adjustment that hasn't shown up in the packet yet
+    isn't sent again until it does or until it times out
+    """
+
+    def __init__(self, game_interface, timeout: float = 0.2):
+        self._game_interface = game_interface
+        self._timeout = timeout
+        self._pending_boost: Dict[int, int] = {}
+        # car index -> (boost_amount, seconds_elapsed when it was sent)
+        self._outstanding_boost: Dict[int, Tuple[int, float]] = {}
+        self.writes_issued = 0
+        self.writes_suppressed = 0
+
+    def set_boost(self, index: int, boost_amount: int):
+        self._pending_boost[index] = boost_amount
+
+    def flush(self, packet: GameTickPacket):
+        """Send everything that was adjusted this tick, minus what the game hasn't caught up to yet"""
+        now = packet.game_info.seconds_elapsed
+
+        for index, (boost_amount, sent_at) in list(self._outstanding_boost.items()):
+            if packet.game_cars[index].boost == boost_amount or now - sent_at > self._timeout:
+                del self._outstanding_boost[index]
+
+        cars = {}
+        for index, boost_amount in self._pending_boost.items():
+            outstanding = self._outstanding_boost.get(index)
+            if outstanding is not None and outstanding[0] == boost_amount:
+                self.writes_suppressed += 1
+                continue
+
+            cars[index] = CarState(boost_amount=boost_amount)
+            self._outstanding_boost[index] = (boost_amount, now)
+
+        self._pending_boost.clear()
+
+        if cars:
+            self._game_interface.set_game_state(GameState(cars=cars))
+            self.writes_issued += 1
+
+    def as_dict(self) -> dict:
+        return {
+            "state_writes_issued": self.writes_issued,
+            "state_writes_suppressed": self.writes_suppressed,
+        }
+
+
 def wait_till_cars_spawned(
-    setup_manager: SetupManager, expected_player_count: int
+    setup_manager: SetupManager, expected_player_count: int,
+    sleep: Callable[[float], None] = time.sleep, clock: Callable[[], float] = time.monotonic
 ) -> GameTickPacket:
     packet = GameTickPacket()
     setup_manager.game_interface.fresh_live_data_packet(packet, 1000, WITNESS_ID)
-    waiting_start = time.monotonic()
-    while packet.num_cars != expected_player_count and time.monotonic() - waiting_start < 5:
+    waiting_start = clock()
+    while packet.num_cars != expected_player_count and clock() - waiting_start < 5:
         print("Game started but no cars are in the packets")
-        time.sleep(0.5)
+        sleep(0.5)
         setup_manager.game_interface.fresh_live_data_packet(packet, 1000, WITNESS_ID)
 
     return packet
 
 
 def manage_game_state(
-    challenge: dict, upgrades: dict, setup_manager: SetupManager
+    challenge: dict, upgrades: dict, setup_manager: SetupManager, evaluator: Optional[ChallengeEvaluator] = None,
+    sleep: Callable[[float], None] = time.sleep, clock: Callable[[], float] = time.monotonic,
+    loop_stats: Optional[dict] = None
 ) -> Tuple[bool, dict]:
     """
     Continuously track the game and adjust state to respect challenge rules and
     upgrades.
     At the end of the game, calculate results and the challenge completion
-    and return that
+    and return that.
+    Timing is taken from the packets, so this can also be driven by a packet trace.
+    If given, loop_stats is filled in with the tick and state write counts
     """
     early_failure = False, None
 
+    if evaluator is None:
+        evaluator = ChallengeEvaluator(challenge)
+
     expected_player_count = challenge["humanTeamSize"] + len(challenge["opponentBots"])
     # Wait for everything to be initialized
-    packet = wait_till_cars_spawned(setup_manager, expected_player_count)
+    # this packet is reused as the buffer for every tick
+    packet = wait_till_cars_spawned(setup_manager, expected_player_count, sleep, clock)
 
     if packet.num_cars == 0:
         print("The game was initialized with no cars")
@@ -268,78 +443,98 @@ def manage_game_state(
     half_field = challenge.get("limitations", []).count("half-field") > 0
 
     stats_tracker = ManualStatsTracker(challenge)
-    last_boost_bump_time = time.monotonic()
-    while True:
-        try:
-            packet = GameTickPacket()
-            setup_manager.game_interface.fresh_live_data_packet(
-                packet, 1000, WITNESS_ID
-            )
-
-            if packet.num_cars == 0:
-                # User seems to have ended the match
-                print("User ended the match")
-                return early_failure
-
-            stats_tracker.updateStats(packet)
-            results = packet_to_game_results(packet)
+    tick_counter = TickCounter(packet.game_info.frame_num)
+    state_writer = StateWriter(setup_manager.game_interface)
+    last_boost_bump_time = packet.game_info.seconds_elapsed
 
-            if has_user_perma_failed(challenge, stats_tracker.stats):
-                time.sleep(1)
-                setup_failure_freeplay(setup_manager, "You failed the challenge!")
+    try:
+        while True:
+            try:
+                setup_manager.game_interface.fresh_live_data_packet(
+                    packet, 1000, WITNESS_ID
+                )
+
+                if packet.num_cars == 0:
+                    # User seems to have ended the match
+                    print("User ended the match")
+                    return early_failure
+
+                if tick_counter.update(packet.game_info.frame_num) == 0:
+                    # nothing new happened since the last packet
+                    continue
+
+                stats_tracker.updateStats(packet)
+                results = packet_to_game_results(packet)
+                evaluator.update(stats_tracker.stats, results)
+
+                if evaluator.perma_failed:
+                    sleep(1)
+                    setup_failure_freeplay(setup_manager, "You failed the challenge!", sleep=sleep, clock=clock)
+                    return early_failure
+
+                if evaluator.already_satisfied:
+                    sleep(3)
+                    setup_failure_freeplay(setup_manager, "Challenge completed!", "green", sleep, clock)
+                    return True, results
+
+                if evaluator.end_by_mercy(results):
+                    sleep(3)
+                    setup_failure_freeplay(setup_manager, "Challenge completed by mercy rule!", "green", sleep, clock)
+                    return True, results
+
+                human_info = packet.game_cars[0]
+
+                # adjust boost
+                if human_info.boost > max_boost and not half_field:
+                    # Adjust boost, unless in heatseeker mode
+                    state_writer.set_boost(0, max_boost)
+
+                if "boost-recharge" in upgrades:
+                    # increase boost at 10% per second
+                    now = packet.game_info.seconds_elapsed
+                    if human_info.boost >= max_boost:
+                        # nothing to recharge, so start counting from now
+                        last_boost_bump_time = now
+                    elif now - last_boost_bump_time > 0.1:
+                        # catch up on every bump that was due if packets were skipped
+                        bumps = int((now - last_boost_bump_time) / 0.1)
+                        last_boost_bump_time = now
+                        state_writer.set_boost(0, min(human_info.boost + bumps, max_boost))
+
+                state_writer.flush(packet)
+
+                if packet.game_info.is_match_ended:
+                    break
+
+            except KeyError:
+                print_exc()
+                # it means that the game was interrupted by the user
+                print("Looks like the game is in a bad state")
+                setup_failure_freeplay(setup_manager, "The game was interrupted.", sleep=sleep, clock=clock)
                 return early_failure
+    finally:
+        tick_counter.report()
+        print(f"Story mode issued {state_writer.writes_issued} state writes, suppressed {state_writer.writes_suppressed}")
+        # diagnostics go out on their own, so they don't end up in the save file with the game results
+        stats = {**tick_counter.as_dict(), **state_writer.as_dict()}
+        emit_event("STORY_LOOP_STATS", stats)
+        if loop_stats is not None:
+            loop_stats.update(stats)
 
-            if end_by_mercy(challenge, stats_tracker.stats, results):
-                time.sleep(3)
-                setup_failure_freeplay(setup_manager, "Challenge completed by mercy rule!", "green")
-                return True, results
-
-            human_info = packet.game_cars[0]
-            game_state = GameState()
-            human_desired_state = CarState()
-            game_state.cars = {0: human_desired_state}
-
-            changed = False
-            # adjust boost
-            if human_info.boost > max_boost and not half_field:
-                # Adjust boost, unless in heatseeker mode
-                human_desired_state.boost_amount = max_boost
-                changed = True
-
-            if "boost-recharge" in upgrades:
-                # increase boost at 10% per second
-                now = time.monotonic()
-                if human_info.boost < max_boost and (now - last_boost_bump_time > 0.1):
-                    changed = True
-                    last_boost_bump_time = now
-                    human_desired_state.boost_amount = min(human_info.boost + 1, max_boost)
-
-            if changed:
-                setup_manager.game_interface.set_game_state(game_state)
-
-            if packet.game_info.is_match_ended:
-                break
-
-        except KeyError:
-            print_exc()
-            # it means that the game was interrupted by the user
-            print("Looks like the game is in a bad state")
-            setup_failure_freeplay(setup_manager, "The game was interrupted.")
-            return early_failure
-
-    return calculate_completion(challenge, stats_tracker.stats, results), results
+    return evaluator.completed, results
 
 
 def run_challenge(
     setup_manager: SetupManager, match_config: MatchConfig, challenge: dict, upgrades: dict, launcher_pref: RocketLeagueLauncherPreference, out: MPQueue
 ) -> Tuple[bool, dict]:
     """Launch the game and keep track of the state"""
+    evaluator = ChallengeEvaluator(challenge)
     start_match_wrapper(setup_manager, match_config, launcher_pref, out)
 
     setup_manager.game_interface.renderer.clear_screen(RENDERING_GROUP)
     game_results = None
     try:
-        game_results = manage_game_state(challenge, upgrades, setup_manager)
+        game_results = manage_game_state(challenge, upgrades, setup_manager, evaluator)
     except:
         # no matter what happens we gotta continue
         print_exc()
@@ -370,3 +565,62 @@ def add_match_result(save_state, challenge_id: str, challenge_completed: bool, g
         save_state["upgrades"]["currency"] += 2
 
     return save_state
+
+
+def match_result_delta(save_state, challenge_id: str, challenge_completed: bool, game_results) -> dict:
+    """Same as add_match_result, but only returns what changed in the save state.
+    Only challenges_attempts[challenge_id], challenges_completed and the currency are read,
+    so the save state doesn't have to contain the attempts of other challenges.
+    """
+    save_state = add_match_result(save_state, challenge_id, challenge_completed, game_results)
+    attempts = save_state["challenges_attempts"][challenge_id]
+
+    delta = {
+        "challenge_id": challenge_id,
+        "attempt_index": len(attempts) - 1,
+        "attempt": attempts[-1],
+    }
+
+    if challenge_completed:
+        delta["challenges_completed"] = {challenge_id: save_state["challenges_completed"][challenge_id]}
+        delta["currency"] = save_state["upgrades"]["currency"]
+
+    return delta
+
+
+def _attempt_rank(attempt) -> Tuple[bool, bool, int]:
+    game_results = attempt["game_results"]
+    if game_results is None:
+        return attempt["challenge_completed"], False, 0
+
+    scores = game_results["score"]
+    human_score = next(s["score"] for s in scores if s["team_index"] == game_results["human_team"])
+    other_score = next((s["score"] for s in scores if s["team_index"] != game_results["human_team"]), 0)
+    return attempt["challenge_completed"], game_results["human_won"], human_score - other_score
+
+
+def compact_attempts(save_state, keep: int) -> Dict[str, List[int]]:
+    """Drop the game results of every attempt except the best and last `keep` of each challenge.
+    Attempts are never removed so the indices in challenges_completed stay valid.
+    Returns the indices of the attempts that were compacted, per challenge
+    """
+    compacted = {}
+
+    for challenge_id, attempts in save_state["challenges_attempts"].items():
+        detailed = [i for i, attempt in enumerate(attempts) if attempt["game_results"] is not None]
+        if len(detailed) <= keep:
+            continue
+
+        best = sorted(detailed, key=lambda i: _attempt_rank(attempts[i]), reverse=True)[:keep]
+        kept = set(best) | set(detailed[-keep:] if keep > 0 else [])
+        if challenge_id in save_state["challenges_completed"]:
+            kept.add(save_state["challenges_completed"][challenge_id])
+
+        dropped = [i for i in detailed if i not in kept]
+        for i in dropped:
+            attempts[i]["game_results"] = None
+
+        if dropped:
+            compacted[challenge_id] = dropped
+
+    return compacted
@@ -0,0 +1,120 @@
+import multiprocessing as mp
+import queue
+from typing import Dict, List
+
+import psutil
+from rlbot.botmanager.helper_process_manager import HelperProcessManager
+from rlbot.setup_manager import SetupManager
+from rlbot.utils import logging_utils
+
+logger = logging_utils.get_logger("teardown")
+
+
+def _root_pids(sm: SetupManager) -> set:
+    pids = set(sm.script_processes.keys())
+
+    for process_info in sm.bot_processes.values():
+        process = process_info.process or process_info.subprocess
+        if process is not None and process.pid is not None:
+            pids.add(process.pid)
+
+    for metadata in sm.agent_metadata_map.values():
+        pids.update(metadata.pids)
+
+    return pids
+
+
+def _collect_processes(pids: set) -> Dict[int, psutil.Process]:
+    processes = {}
+    for pid in pids:
+        try:
+            process = psutil.Process(pid)
+            processes[pid] = process
+            for child in process.children(recursive=True):
+                processes[child.pid] = child
+        except psutil.Error:
+            pass
+    return processes
+
+
+def _describe(processes: List[psutil.Process], names: Dict[int, str]) -> List[dict]:
+    return [{"pid": process.pid, "name": names.get(process.pid, "")} for process in processes]
+
+
+def _reset_setup_manager(sm: SetupManager):
+    """
+    What SetupManager.shut_down resets once the processes are gone,
+    without its waits (it always sleeps for 0.5s while killing pids, even if there aren't any)
+    """
+    for process_info in sm.bot_processes.values():
+        # reap them so they don't linger as zombies
+        if process_info.process is not None:
+            process_info.process.join(timeout=0)
+        elif process_info.subprocess is not None:
+            process_info.subprocess.poll()
+    sm.bot_processes.clear()
+    sm.num_metadata_received = 0
+    sm.script_processes.clear()
+
+    sm.kill_matchcomms_server()
+
+    # make sure no metadata from the old bots turns up later
+    while True:
+        try:
+            sm.agent_metadata_queue.get_nowait()
+        except queue.Empty:
+            break
+
+    # the quit event can only be set once
+    sm.quit_event = mp.Event()
+    sm.helper_process_manager = HelperProcessManager(sm.quit_event)
+
+
+def shut_down_quickly(sm: SetupManager, graceful_seconds: float = 0.5, terminate_seconds: float = 0.5) -> dict:
+    """
+    Stop every bot and script process at the same time instead of one by one.
+    Processes get graceful_seconds to quit on their own, then terminate_seconds after being terminated,
+    and are killed after that.
+    Returns which processes had to be terminated or killed.
+    """
+    processes = _collect_processes(_root_pids(sm))
+
+    names = {}
+    for pid, process in processes.items():
+        try:
+            names[pid] = process.name()
+        except psutil.Error:
+            pass
+
+    # rlbot's own bot managers quit when they see this
+    sm.quit_event.set()
+    _, alive = psutil.wait_procs(list(processes.values()), timeout=graceful_seconds)
+
+    for process in alive:
+        try:
+            process.terminate()
+        except psutil.Error:
+            pass
+    _, alive_after_terminate = psutil.wait_procs(alive, timeout=terminate_seconds)
+    terminated = [process for process in alive if process not in alive_after_terminate]
+
+    for process in alive_after_terminate:
+        try:
+            process.kill()
+        except psutil.Error:
+            pass
+    psutil.wait_procs(alive_after_terminate, timeout=terminate_seconds)
+
+    _reset_setup_manager(sm)
+
+    report = {
+        "processes": len(processes),
+        "terminated": _describe(terminated, names),
+        "killed": _describe(alive_after_terminate, names),
+    }
+
+    if report["terminated"] or report["killed"]:
+        logger.warning(f"Had to terminate {len(terminated)} and kill {len(alive_after_terminate)} "
+                       f"of {len(processes)} bot and script processes")
+
+    return report